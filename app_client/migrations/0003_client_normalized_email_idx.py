@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:00
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+    """
+    Индекс строится без блокировки записи в таблицу клиентов (CREATE INDEX CONCURRENTLY).
+    """
+
+    atomic = False
+
+    dependencies = [
+        ('app_client', '0002_initial'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='client',
+            index=models.Index(django.db.models.functions.text.Lower(django.db.models.functions.text.Trim('email')), name='clients_normalized_email_idx'),
+        ),
+    ]
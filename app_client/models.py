@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Lower, Trim
 
 NULLABLE = {'blank': True, 'null': True}
 
@@ -16,6 +17,10 @@ class Client(models.Model):
         db_table = 'clients'
         verbose_name = 'Клиент'
         verbose_name_plural = 'Клиенты'
+        # Поиск клиентов с тем же адресом при отправке рассылки (без пробелов по краям, в нижнем регистре)
+        indexes = [
+            models.Index(Lower(Trim('email')), name='clients_normalized_email_idx'),
+        ]
 
     def __str__(self):
         return f'{self.first_name} {self.last_name}'
@@ -7,6 +7,7 @@ from django.shortcuts import redirect
 from django.urls import reverse_lazy, reverse
 from django.views.generic import CreateView, ListView, UpdateView, DeleteView
 
+from pagination.keyset import KeysetPaginationMixin
 from permissions.authenticate import AuthenticatedAccessMixin
 from permissions.user_permission import CreatorAccessMixin
 from .forms import ClientCreateForm
@@ -40,7 +41,7 @@ class ClientCreateView(AuthenticatedAccessMixin, CreateView):
         return context
 
 
-class ClientListView(AuthenticatedAccessMixin, ListView):
+class ClientListView(AuthenticatedAccessMixin, KeysetPaginationMixin, ListView):
     model = Client
     paginate_by = 5
 
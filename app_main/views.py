@@ -3,6 +3,7 @@ from random import sample
 from django.views.generic import TemplateView
 
 from app_blog.models import Post
+from app_newsletter.services import DeliveryStatsService
 from .services import MainPageDataCachingServices
 
 
@@ -14,6 +15,8 @@ class IndexPageView(TemplateView):
         context['total_newsletters'] = MainPageDataCachingServices.get_total_newsletter()
         context['active_newsletters'] = MainPageDataCachingServices.get_active_newsletters()
         context['unique_clients'] = MainPageDataCachingServices.get_unique_clients()
+        if self.request.user.is_authenticated:
+            context['delivery_totals'] = DeliveryStatsService.get_owner_totals(owner_id=self.request.user.pk)
 
         all_posts = list(Post.objects.all())
         context['random_blog_posts'] = sample(all_posts, min(3, len(all_posts)))
@@ -1,6 +1,8 @@
 from django import forms
+from django.template import TemplateSyntaxError
 
 from .models import Message
+from .services import template_engine
 
 
 class MessageCreateForm(forms.ModelForm):
@@ -18,3 +20,22 @@ class MessageCreateForm(forms.ModelForm):
 
         self.fields['subject'].widget.attrs['placeholder'] = 'Введите тему письма'
         self.fields['body'].widget.attrs['placeholder'] = 'Введите содержание письма'
+        self.fields['body'].help_text = 'Для подстановки данных клиента используйте ' \
+                                        '{{ first_name }}, {{ last_name }}, {{ middle_name }} и {{ email }}'
+
+    def clean_subject(self) -> str:
+
+        return self.clean_template(self.cleaned_data.get('subject'))
+
+    def clean_body(self) -> str:
+
+        return self.clean_template(self.cleaned_data.get('body'))
+
+    @staticmethod
+    def clean_template(text: str) -> str:
+
+        try:
+            template_engine.from_string(text)
+        except TemplateSyntaxError as error:
+            raise forms.ValidationError(f'Ошибка в шаблоне: {error}')
+        return text
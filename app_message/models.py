@@ -7,6 +7,7 @@ class Message(models.Model):
 
     subject = models.CharField(max_length=255, verbose_name='Тема письма')
     body = models.TextField(verbose_name='Тело письма')
+    version = models.PositiveIntegerField(default=1, editable=False, verbose_name='Версия')
     created_by = models.ForeignKey(CustomUser, on_delete=models.CASCADE, verbose_name='Создан',
                                    related_name='messages')
 
@@ -17,3 +18,8 @@ class Message(models.Model):
 
     def __str__(self):
         return self.subject
+
+    def save(self, *args, **kwargs):
+        if self.pk:
+            self.version += 1
+        super().save(*args, **kwargs)
@@ -0,0 +1,99 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.template import Context, Engine, Template, TemplateSyntaxError
+
+from .models import Message
+
+logger = logging.getLogger(__name__)
+
+
+class MessageTemplateEngine(Engine):
+    """
+    Движок шаблонов сообщений. Вместо встроенных тегов Django доступны только теги и фильтры
+    app_message.template_library, поэтому шаблон с другими тегами не компилируется.
+    """
+
+    default_builtins = ['app_message.template_library']
+
+
+template_engine = MessageTemplateEngine(autoescape=False)
+
+
+class CompiledMessage:
+    """
+    Сообщение с заранее скомпилированными шаблонами темы и тела письма.
+    Для каждого клиента подставляется только контекст: {{ first_name }}, {{ last_name }},
+    {{ middle_name }} и {{ email }}.
+    """
+
+    def __init__(self, message: Message) -> None:
+        self.subject = message.subject
+        self.body = message.body
+        self.subject_template = self.compile(message.subject)
+        self.body_template = self.compile(message.body)
+        self.is_personalized = self.subject_template is not None or self.body_template is not None
+
+    @staticmethod
+    def is_template(text: str) -> bool:
+        return '{{' in text or '{%' in text
+
+    @classmethod
+    def compile(cls, text: str) -> Optional[Template]:
+        if not cls.is_template(text):
+            return None
+        try:
+            return template_engine.from_string(text)
+        except TemplateSyntaxError as error:
+            logger.warning(f'Ошибка в шаблоне письма, текст будет отправлен без подстановки: {error}')
+            return None
+
+    def render(self, client) -> Tuple[str, str]:
+        """
+        Возвращает тему и тело письма для клиента.
+        """
+        if not self.is_personalized:
+            return self.subject, self.body
+
+        context = Context({
+            'first_name': client.first_name,
+            'last_name': client.last_name,
+            'middle_name': client.middle_name or '',
+            'email': client.email,
+        })
+        subject = self.subject_template.render(context) if self.subject_template else self.subject
+        body = self.body_template.render(context) if self.body_template else self.body
+        return ' '.join(subject.splitlines()), body
+
+
+class MessageRenderingService:
+    """
+    Кеш скомпилированных сообщений в памяти процесса.
+    Запись кеша привязана к версии сообщения, которая увеличивается при каждом сохранении,
+    поэтому отредактированное сообщение компилируется заново.
+    """
+
+    cache = OrderedDict()
+    cache_lock = threading.Lock()
+
+    @classmethod
+    def get_compiled(cls, message: Message) -> CompiledMessage:
+
+        with cls.cache_lock:
+            cached = cls.cache.get(message.pk)
+            if cached is not None and cached[0] == message.version:
+                cls.cache.move_to_end(message.pk)
+                return cached[1]
+
+        compiled = CompiledMessage(message)
+
+        with cls.cache_lock:
+            cls.cache[message.pk] = (message.version, compiled)
+            cls.cache.move_to_end(message.pk)
+            while len(cls.cache) > settings.MESSAGE_TEMPLATE_CACHE_SIZE:
+                cls.cache.popitem(last=False)
+
+        return compiled
@@ -0,0 +1,14 @@
+from django.template import Library, defaultfilters, defaulttags
+
+# Библиотека тегов и фильтров шаблонов сообщений (см. MessageTemplateEngine).
+# Шаблоны пишут пользователи, поэтому доступны только теги оформления текста: без {% debug %},
+# выводящего контекст и загруженные модули, без {% load %}, {% include %} и {% extends %},
+# открывающих шаблоны и библиотеки сайта, и без тегов, зависящих от запроса ({% url %}, {% csrf_token %})
+ALLOWED_TAGS = [
+    'autoescape', 'comment', 'cycle', 'filter', 'firstof', 'for', 'if', 'ifchanged', 'lorem', 'now',
+    'regroup', 'resetcycle', 'spaceless', 'templatetag', 'verbatim', 'widthratio', 'with',
+]
+
+register = Library()
+register.filters.update(defaultfilters.register.filters)
+register.tags.update({name: defaulttags.register.tags[name] for name in ALLOWED_TAGS})
@@ -1,3 +1,30 @@
-from django.test import TestCase
+from django.test import SimpleTestCase
 
-# Create your tests here.
+from app_client.models import Client
+
+from .forms import MessageCreateForm
+from .models import Message
+from .services import CompiledMessage
+
+
+class MessageTemplateTest(SimpleTestCase):
+
+    def test_client_fields_and_filters_are_rendered(self):
+        message = Message(subject='Привет, {{ first_name|upper }}',
+                          body='{% if middle_name %}{{ middle_name }}{% else %}{{ email }}{% endif %}')
+        client = Client(first_name='Имя', last_name='Фамилия', email='a@test.ru')
+
+        self.assertEqual(CompiledMessage(message).render(client), ('Привет, ИМЯ', 'a@test.ru'))
+
+    def test_form_rejects_unsafe_tags(self):
+        for body in ['{% debug %}', '{% load static %}', '{% include "base.html" %}', '{% extends "base.html" %}',
+                     '{% url "home" %}', '{% csrf_token %}']:
+            with self.subTest(body=body):
+                form = MessageCreateForm(data={'subject': 'Тема', 'body': body})
+                self.assertFalse(form.is_valid())
+                self.assertIn('body', form.errors)
+
+    def test_stored_unsafe_template_is_sent_as_text(self):
+        message = Message(subject='Тема', body='{% debug %}')
+
+        self.assertIsNone(CompiledMessage(message).body_template)
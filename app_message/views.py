@@ -7,6 +7,7 @@ from django.shortcuts import redirect
 from django.urls import reverse_lazy, reverse
 from django.views.generic import CreateView, ListView, UpdateView, DeleteView
 
+from pagination.keyset import KeysetPaginationMixin
 from permissions.authenticate import AuthenticatedAccessMixin
 from permissions.user_permission import CreatorAccessMixin
 from .forms import MessageCreateForm
@@ -36,7 +37,7 @@ class MessageCreateView(AuthenticatedAccessMixin, CreateView):
         return context
 
 
-class MessageListView(AuthenticatedAccessMixin, ListView):
+class MessageListView(AuthenticatedAccessMixin, KeysetPaginationMixin, ListView):
 
     model = Message
     paginate_by = 5
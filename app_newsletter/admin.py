@@ -1,16 +1,113 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Q, QuerySet, Sum
+from django.utils.functional import cached_property
 
-from .models import Newsletter, NewsletterLog
+from .models import (
+    Newsletter, NewsletterLog, NewsletterRun, NewsletterRunChunk, NewsletterRetry, ServerResponse,
+    NewsletterDeliveryStats
+)
+from .services import NewsletterLogArchiveService
 
 
 @admin.register(Newsletter)
 class NewsletterAdmin(admin.ModelAdmin):
-    list_display = ['pk', 'time', 'frequency', 'status', 'created_at', 'is_active', 'created_by']
+    list_display = ['pk', 'time', 'frequency', 'status', 'created_at', 'is_active', 'created_by', 'sent_count',
+                    'failed_count']
 
     class Media:
         js = ('js/select_all.js',)
 
+    def get_queryset(self, request) -> QuerySet[Newsletter]:
+        """
+        Добавляет к рассылкам количество отправленных писем и ошибок из статистики отправок.
+        """
+        return super().get_queryset(request).annotate(
+            sent_total=Sum('delivery_stats__count', filter=Q(delivery_stats__status='S')),
+            failed_total=Sum('delivery_stats__count', filter=Q(delivery_stats__status='F')),
+        )
+
+    @admin.display(description='Отправлено писем', ordering='sent_total')
+    def sent_count(self, obj: Newsletter) -> int:
+        return obj.sent_total or 0
+
+    @admin.display(description='Ошибок отправки', ordering='failed_total')
+    def failed_count(self, obj: Newsletter) -> int:
+        return obj.failed_total or 0
+
+    def delete_model(self, request, obj: Newsletter) -> None:
+        NewsletterLogArchiveService.purge_newsletter_logs(newsletter_ids=[obj.pk])
+        super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset) -> None:
+        NewsletterLogArchiveService.purge_newsletter_logs(newsletter_ids=list(queryset.values_list('pk', flat=True)))
+        super().delete_queryset(request, queryset)
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор, который для списка логов без фильтров берёт примерное количество строк
+    из статистики PostgreSQL вместо COUNT(*) по всей таблице.
+    """
+
+    @cached_property
+    def count(self) -> int:
+        if connection.vendor == 'postgresql' and not self.object_list.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+                               [self.object_list.model._meta.db_table])
+                row = cursor.fetchone()
+            if row and row[0] > 0:
+                return row[0]
+        return super().count
+
 
 @admin.register(NewsletterLog)
 class NewsletterLogAdmin(admin.ModelAdmin):
-    list_display = ['date_time', 'status']
+    list_display = ['date_time', 'status', 'newsletter', 'owner', 'server_response']
+    list_filter = ['status']
+    list_select_related = ['newsletter', 'owner', 'response']
+    ordering = ['-date_time', '-id']
+    raw_id_fields = ['client', 'message', 'newsletter', 'owner', 'response']
+    readonly_fields = ['server_response']
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+
+
+class NewsletterRunChunkInline(admin.TabularInline):
+    model = NewsletterRunChunk
+    fields = ['first_client_id', 'last_client_id', 'status', 'sent_count', 'failed_count', 'checkpoint', 'updated_at']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+
+@admin.register(NewsletterRun)
+class NewsletterRunAdmin(admin.ModelAdmin):
+    inlines = [NewsletterRunChunkInline]
+    list_display = ['pk', 'newsletter', 'status', 'started_at', 'finished_at', 'sent_count', 'failed_count',
+                    'duplicates_skipped']
+
+
+@admin.register(NewsletterRetry)
+class NewsletterRetryAdmin(admin.ModelAdmin):
+    list_display = ['pk', 'newsletter', 'message', 'client', 'attempts', 'next_attempt_at', 'last_error']
+    list_select_related = ['newsletter', 'message', 'client']
+
+
+@admin.register(ServerResponse)
+class ServerResponseAdmin(admin.ModelAdmin):
+    list_display = ['pk', 'text']
+    search_fields = ['text']
+
+
+@admin.register(NewsletterDeliveryStats)
+class NewsletterDeliveryStatsAdmin(admin.ModelAdmin):
+    list_display = ['day', 'newsletter', 'owner', 'status', 'count']
+    list_filter = ['status']
+    list_select_related = ['newsletter', 'owner']
+    ordering = ['-day', 'newsletter']
+    date_hierarchy = 'day'
+    raw_id_fields = ['newsletter', 'owner']
+    readonly_fields = ['newsletter', 'owner', 'day', 'status', 'count']
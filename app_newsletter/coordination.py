@@ -0,0 +1,294 @@
+import hashlib
+import logging
+import smtplib
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, ContextManager, Iterator, Optional, TypeVar
+
+import redis
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+redis_client = None
+redis_client_lock = threading.Lock()
+
+
+def get_redis_client() -> redis.Redis:
+    """
+    Возвращает общий для процесса клиент Redis, через который согласуют работу все воркеры рассылок.
+    """
+    global redis_client
+    with redis_client_lock:
+        if redis_client is None:
+            redis_client = redis.Redis.from_url(settings.NEWSLETTER_REDIS_URL, socket_timeout=5,
+                                            socket_connect_timeout=5)
+    return redis_client
+
+
+class SMTPRateLimiter:
+    """
+    Ограничитель скорости отправки писем по алгоритму token bucket, общий для всех воркеров.
+    Состояние корзины хранится в Redis под ключом почтового сервера и учётной записи.
+
+    Скорость адаптивная: на ответ сервера 4xx о перегрузке она уменьшается в backoff раз,
+    а затем плавно восстанавливается на recovery писем в секунду за каждую секунду.
+    Если Redis недоступен, ограничение отключается до конца запуска, а отправка продолжается.
+    """
+
+    THROTTLING_CODES = {421, 450, 451, 452}
+
+    ACQUIRE_SCRIPT = """
+        local now_parts = redis.call('TIME')
+        local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+        local max_rate = tonumber(ARGV[1])
+        local burst = tonumber(ARGV[2])
+        local recovery = tonumber(ARGV[3])
+
+        local state = redis.call('HMGET', KEYS[1], 'tokens', 'rate', 'updated_at')
+        local rate = tonumber(state[2]) or max_rate
+        local tokens = tonumber(state[1]) or burst
+        local updated_at = tonumber(state[3]) or now
+        local elapsed = math.max(0, now - updated_at)
+
+        rate = math.min(max_rate, rate + recovery * elapsed)
+        tokens = math.min(burst, tokens + rate * elapsed) - 1
+
+        redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'rate', tostring(rate), 'updated_at', tostring(now))
+        redis.call('EXPIRE', KEYS[1], 3600)
+
+        if tokens >= 0 then
+            return '0'
+        end
+        return tostring(-tokens / rate)
+    """
+
+    PENALIZE_SCRIPT = """
+        local rate = tonumber(redis.call('HGET', KEYS[1], 'rate')) or tonumber(ARGV[1])
+        rate = math.max(tonumber(ARGV[2]), rate * tonumber(ARGV[3]))
+        redis.call('HSET', KEYS[1], 'rate', tostring(rate))
+        redis.call('EXPIRE', KEYS[1], 3600)
+        return tostring(rate)
+    """
+
+    def __init__(self) -> None:
+        self.max_rate = settings.NEWSLETTER_SMTP_RATE_LIMIT
+        self.enabled = self.max_rate is not None
+        self.key = f'newsletter:smtp-rate:{settings.EMAIL_HOST}:{settings.EMAIL_HOST_USER}'
+
+    def acquire(self) -> None:
+        """
+        Забирает из корзины токен на отправку одного письма и ждёт, если токенов не хватает.
+        """
+        if not self.enabled:
+            return
+        try:
+            wait = float(get_redis_client().eval(
+                self.ACQUIRE_SCRIPT, 1, self.key,
+                self.max_rate, settings.NEWSLETTER_SMTP_RATE_BURST, settings.NEWSLETTER_SMTP_RATE_RECOVERY
+            ))
+        except redis.RedisError as error:
+            self.disable(error)
+            return
+        if wait > 0:
+            time.sleep(wait)
+
+    def penalize(self) -> None:
+        """
+        Снижает скорость отправки после ответа сервера о перегрузке.
+        """
+        if not self.enabled:
+            return
+        try:
+            rate = get_redis_client().eval(
+                self.PENALIZE_SCRIPT, 1, self.key,
+                self.max_rate, settings.NEWSLETTER_SMTP_RATE_LIMIT_MIN, settings.NEWSLETTER_SMTP_RATE_BACKOFF
+            )
+        except redis.RedisError as error:
+            self.disable(error)
+            return
+        logger.warning(f'Почтовый сервер ограничивает отправку, скорость снижена до {float(rate):.2f} писем/с')
+
+    def disable(self, error: Exception) -> None:
+        self.enabled = False
+        logger.warning(f'Redis недоступен, ограничение скорости отправки отключено: {error}')
+
+    @classmethod
+    def is_throttling_error(cls, error: Exception) -> bool:
+        if isinstance(error, smtplib.SMTPResponseException):
+            return error.smtp_code in cls.THROTTLING_CODES
+        if isinstance(error, smtplib.SMTPRecipientsRefused):
+            return any(code in cls.THROTTLING_CODES for code, _ in error.recipients.values())
+        return False
+
+
+class NewsletterRunLock:
+    """
+    Аренда запуска рассылки в Redis, которая не даёт одной рассылке отправляться параллельно
+    (например, по расписанию и из команды sendnewsletter одновременно).
+
+    Аренда выдаётся на ttl секунд и продлевается heartbeat-потоком, пока идёт отправка.
+    Если держатель аренды упал, она истекает сама. Продлить и снять аренду может только
+    владелец токена, с которым она была получена.
+    Если Redis недоступен, блокировка не проверяется, чтобы не останавливать рассылки.
+    """
+
+    RENEW_SCRIPT = """
+        if redis.call('GET', KEYS[1]) == ARGV[1] then
+            return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+        end
+        return 0
+    """
+
+    RELEASE_SCRIPT = """
+        if redis.call('GET', KEYS[1]) == ARGV[1] then
+            return redis.call('DEL', KEYS[1])
+        end
+        return 0
+    """
+
+    def __init__(self, newsletter_id: int, token: Optional[str] = None, ttl: int = None) -> None:
+        self.key = f'newsletter:run-lock:{newsletter_id}'
+        self.token = token or uuid.uuid4().hex
+        self.ttl = ttl or settings.NEWSLETTER_RUN_LOCK_TTL
+
+    def acquire(self) -> bool:
+        """
+        Получает аренду. Возвращает False, если рассылку уже отправляет другой процесс.
+        """
+        try:
+            return bool(get_redis_client().set(self.key, self.token, nx=True, px=self.ttl * 1000))
+        except redis.RedisError as error:
+            logger.warning(f'Redis недоступен, запуск рассылки без блокировки: {error}')
+            return True
+
+    def renew(self) -> bool:
+        try:
+            return bool(get_redis_client().eval(self.RENEW_SCRIPT, 1, self.key, self.token, self.ttl * 1000))
+        except redis.RedisError as error:
+            logger.warning(f'Не удалось продлить блокировку рассылки: {error}')
+            return True
+
+    def release(self) -> None:
+        try:
+            get_redis_client().eval(self.RELEASE_SCRIPT, 1, self.key, self.token)
+        except redis.RedisError as error:
+            logger.warning(f'Не удалось снять блокировку рассылки: {error}')
+
+    def heartbeat(self) -> ContextManager['NewsletterRunLock']:
+        """
+        Продлевает аренду в фоновом потоке каждые ttl / 3 секунд, пока выполняется блок with.
+        """
+        return keep_alive(self, renew=self.renew, interval=self.ttl / 3)
+
+
+class OwnerConcurrencyLimiter:
+    """
+    Ограничивает количество одновременно отправляемых частей рассылок одного пользователя,
+    чтобы рассылки одного большого аккаунта не занимали все воркеры.
+
+    Занятые слоты хранятся в Redis в sorted set пользователя: токен слота и время, до которого он действителен.
+    Слот продлевается heartbeat-потоком, пока часть отправляется, а слот упавшего воркера истекает сам.
+    Если Redis недоступен или лимит не задан, ограничение не действует.
+    """
+
+    ACQUIRE_SCRIPT = """
+        local now_parts = redis.call('TIME')
+        local now = tonumber(now_parts[1]) * 1000 + math.floor(tonumber(now_parts[2]) / 1000)
+        local ttl = tonumber(ARGV[3])
+
+        redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+        if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[2]) then
+            return 0
+        end
+        redis.call('ZADD', KEYS[1], now + ttl, ARGV[1])
+        redis.call('PEXPIRE', KEYS[1], ttl)
+        return 1
+    """
+
+    RENEW_SCRIPT = """
+        local now_parts = redis.call('TIME')
+        local now = tonumber(now_parts[1]) * 1000 + math.floor(tonumber(now_parts[2]) / 1000)
+        local ttl = tonumber(ARGV[2])
+
+        if not redis.call('ZSCORE', KEYS[1], ARGV[1]) then
+            return 0
+        end
+        redis.call('ZADD', KEYS[1], now + ttl, ARGV[1])
+        redis.call('PEXPIRE', KEYS[1], ttl)
+        return 1
+    """
+
+    def __init__(self, owner_id: int, ttl: int = None) -> None:
+        self.limit = settings.NEWSLETTER_OWNER_CONCURRENCY
+        self.key = f'newsletter:owner-slots:{owner_id}'
+        self.token = uuid.uuid4().hex
+        self.ttl = ttl or settings.NEWSLETTER_OWNER_SLOT_TTL
+
+    def acquire(self) -> bool:
+        """
+        Занимает слот пользователя. Возвращает False, если все его слоты заняты.
+        """
+        if self.limit is None:
+            return True
+        try:
+            return bool(get_redis_client().eval(self.ACQUIRE_SCRIPT, 1, self.key, self.token, self.limit,
+                                                self.ttl * 1000))
+        except redis.RedisError as error:
+            logger.warning(f'Redis недоступен, отправка без ограничения параллельности пользователя: {error}')
+            return True
+
+    def renew(self) -> bool:
+        if self.limit is None:
+            return True
+        try:
+            return bool(get_redis_client().eval(self.RENEW_SCRIPT, 1, self.key, self.token, self.ttl * 1000))
+        except redis.RedisError as error:
+            logger.warning(f'Не удалось продлить слот пользователя: {error}')
+            return True
+
+    def release(self) -> None:
+        if self.limit is None:
+            return
+        try:
+            get_redis_client().zrem(self.key, self.token)
+        except redis.RedisError as error:
+            logger.warning(f'Не удалось освободить слот пользователя: {error}')
+
+    def heartbeat(self) -> ContextManager['OwnerConcurrencyLimiter']:
+        return keep_alive(self, renew=self.renew, interval=self.ttl / 3)
+
+
+def get_owner_queue(owner_id: int) -> str:
+    """
+    Возвращает очередь Celery, в которую отправляются части рассылок пользователя.
+    Пользователи распределяются по NEWSLETTER_DELIVERY_QUEUE_COUNT очередям по хешу id,
+    поэтому количество очередей не зависит от количества пользователей.
+    """
+    digest = hashlib.blake2b(str(owner_id).encode(), digest_size=8).digest()
+    return f'newsletters.{int.from_bytes(digest, "big") % settings.NEWSLETTER_DELIVERY_QUEUE_COUNT}'
+
+
+@contextmanager
+def keep_alive(resource: T, renew: Callable[[], bool], interval: float) -> Iterator[T]:
+    """
+    Вызывает renew в фоновом потоке каждые interval секунд, пока выполняется блок with.
+    """
+    stopped = threading.Event()
+
+    def renew_periodically() -> None:
+        while not stopped.wait(interval):
+            if not renew():
+                logger.warning(f'Аренда {resource.key} потеряна: её держит другой процесс')
+
+    thread = threading.Thread(target=renew_periodically, name='newsletter-keep-alive', daemon=True)
+    thread.start()
+    try:
+        yield resource
+    finally:
+        stopped.set()
+        thread.join()
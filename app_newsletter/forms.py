@@ -2,7 +2,8 @@ from datetime import datetime
 
 from django import forms
 
-from .models import Newsletter
+from .models import Newsletter, NewsletterLog
+from .services import NewsletterLogExportService
 
 
 class NewsletterCreateForm(forms.ModelForm):
@@ -36,3 +37,27 @@ class NewsletterCreateForm(forms.ModelForm):
             raise forms.ValidationError("Дата завершения должна быть больше текущей даты")
 
         return finish_date
+
+
+class NewsletterLogExportForm(forms.Form):
+    """
+    Параметры выгрузки журнала рассылок из строки запроса.
+    """
+
+    format = forms.ChoiceField(choices=[(choice, choice) for choice in NewsletterLogExportService.FORMATS],
+                               required=False)
+    newsletter = forms.IntegerField(min_value=1, required=False)
+    status = forms.ChoiceField(choices=NewsletterLog.STATUS_CHOICES, required=False)
+    date_from = forms.DateField(required=False)
+    date_to = forms.DateField(required=False)
+
+    def clean(self):
+
+        cleaned_data = super().clean()
+        date_from = cleaned_data.get('date_from')
+        date_to = cleaned_data.get('date_to')
+
+        if date_from and date_to and date_from > date_to:
+            raise forms.ValidationError('Начальная дата не может быть позже конечной')
+
+        return cleaned_data
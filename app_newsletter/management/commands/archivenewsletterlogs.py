@@ -0,0 +1,64 @@
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError, CommandParser
+from django.utils import timezone
+
+from app_newsletter.services import NewsletterLogArchiveService
+
+
+class Command(BaseCommand):
+    """
+    Команда для переноса старых логов отправки в архив.
+    Пример команды: 'python manage.py archivenewsletterlogs --days 90 --format csv'
+    """
+    help = 'Move old newsletter logs to compressed archive files and delete them from the database'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """
+        Добавляет необходимые аргументы для команды.
+        --days задаёт срок хранения логов в базе, --format — формат архива,
+        --output-dir — каталог архива, --batch-size — размер пачки,
+        --no-delete записывает архив, не удаляя логи из базы.
+        """
+        parser.add_argument('--days', type=int, default=settings.NEWSLETTER_LOG_RETENTION_DAYS,
+                            help='Archive logs older than this many days')
+        parser.add_argument('--format', choices=['jsonl', 'csv'], default='jsonl', help='Archive file format')
+        parser.add_argument('--output-dir', default=settings.NEWSLETTER_LOG_ARCHIVE_DIR,
+                            help='Directory for archive files')
+        parser.add_argument('--batch-size', type=int, default=settings.NEWSLETTER_LOG_ARCHIVE_BATCH_SIZE,
+                            help='Number of logs archived and deleted per transaction')
+        parser.add_argument('--no-delete', action='store_true', help='Write the archive without deleting logs')
+
+    def handle(self, *args, **options) -> None:
+        """
+        Обработчик команды. Записывает логи старше заданного срока в файл
+        newsletter_logs_<дата>.<формат>.gz в каталоге архива и удаляет их из базы пачками.
+        """
+        if options['days'] < 0:
+            raise CommandError('--days must not be negative')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        now = timezone.now()
+        cutoff = now - timedelta(days=options['days'])
+        os.makedirs(options['output_dir'], exist_ok=True)
+        path = os.path.join(
+            options['output_dir'], f'newsletter_logs_{now:%Y%m%d_%H%M%S}.{options["format"]}.gz'
+        )
+
+        archive_service = NewsletterLogArchiveService(cutoff=cutoff, batch_size=options['batch_size'])
+        try:
+            archived = archive_service.archive(path=path, file_format=options['format'],
+                                               delete=not options['no_delete'])
+        except FileExistsError:
+            raise CommandError(f'Archive file "{path}" already exists')
+
+        if not archived:
+            os.remove(path)
+            self.stdout.write(f'No logs older than {cutoff:%Y-%m-%d %H:%M} to archive')
+            return
+
+        action = 'Archived' if options['no_delete'] else 'Archived and deleted'
+        self.stdout.write(self.style.SUCCESS(f'{action} {archived} logs older than {cutoff:%Y-%m-%d %H:%M} to {path}'))
@@ -0,0 +1,48 @@
+from django.core.management import BaseCommand, CommandError, CommandParser
+
+from app_newsletter.models import Newsletter
+from app_newsletter.services import DeliveryStatsService
+
+
+class Command(BaseCommand):
+    """
+    Команда для пересчёта статистики отправок по логам в newsletter_logs.
+    Пример команды: 'python manage.py backfilldeliverystats --newsletters 1 2 3'
+
+    Нужна один раз после появления таблицы статистики и после ручных правок логов.
+    Запускать её следует, пока рассылки не отправляются: письма, записанные во время пересчёта,
+    могут не попасть в статистику или попасть в неё дважды.
+    """
+    help = 'Rebuild newsletter delivery statistics from newsletter logs'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """
+        Добавляет необходимые аргументы для команды.
+        --newsletters ограничивает пересчёт указанными рассылками,
+        --batch-size задаёт количество рассылок, пересчитываемых в одной транзакции.
+        """
+        parser.add_argument('--newsletters', nargs='+', type=int, help='Newsletter ids, all newsletters by default')
+        parser.add_argument('--batch-size', type=int, default=100, help='Newsletters rebuilt per transaction')
+
+    def handle(self, *args, **options) -> None:
+        """
+        Обработчик команды. Пересчитывает статистику рассылок пачками и выводит количество счётчиков.
+        """
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        newsletters = Newsletter.objects.order_by('pk')
+        if options['newsletters']:
+            newsletters = newsletters.filter(pk__in=options['newsletters'])
+        newsletter_ids = list(newsletters.values_list('pk', flat=True))
+
+        created = 0
+        for start in range(0, len(newsletter_ids), options['batch_size']):
+            batch = newsletter_ids[start:start + options['batch_size']]
+            created += DeliveryStatsService.rebuild(newsletter_ids=batch)
+            self.stdout.write(f'Rebuilt {min(start + len(batch), len(newsletter_ids))}/{len(newsletter_ids)} '
+                              f'newsletters')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt delivery statistics of {len(newsletter_ids)} newsletters: {created} daily counters'
+        ))
@@ -0,0 +1,121 @@
+import statistics
+import time
+from typing import Dict
+
+from django.core.management import BaseCommand, CommandError, CommandParser
+from django.db import connection, transaction
+from django.db.models import QuerySet
+
+from app_newsletter.models import Newsletter, NewsletterLog
+from app_newsletter.services import ServerResponseCache
+
+
+class Command(BaseCommand):
+    """
+    Команда для замера скорости страниц журнала рассылок на PostgreSQL.
+    Пример команды: 'python manage.py benchmarknewsletterlogs --populate 10000000'
+
+    Каждый запрос страницы выполняется дважды: с запрещёнными индексными сканированиями
+    (так таблица читается без индексов) и в обычном режиме, с индексами newsletter_logs.
+    """
+    help = 'Benchmark newsletter log list queries with and without indexes (PostgreSQL only)'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--populate', type=int, default=0,
+                            help='Insert this many synthetic log rows for existing newsletters before measuring')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per query, the median is reported')
+        parser.add_argument('--page', type=int, default=1, help='Page number to measure')
+        parser.add_argument('--page-size', type=int, default=5, help='Rows per page, as in the log list view')
+        parser.add_argument('--explain', action='store_true', help='Print EXPLAIN ANALYZE of every query')
+
+    def handle(self, *args, **options) -> None:
+        """
+        Обработчик команды. При необходимости заполняет таблицу логов синтетическими строками,
+        затем выводит медианное время каждого запроса без индексов и с индексами.
+        """
+        if connection.vendor != 'postgresql':
+            raise CommandError('The benchmark requires PostgreSQL')
+        if not Newsletter.objects.exists():
+            raise CommandError('Create at least one newsletter first')
+
+        if options['populate']:
+            self.populate(rows=options['populate'])
+
+        offset = (options['page'] - 1) * options['page_size']
+        total = NewsletterLog.objects.count()
+        self.stdout.write(f'newsletter_logs: {total} rows, page {options["page"]} of {options["page_size"]} rows')
+
+        for name, queryset in self.get_querysets().items():
+            page = queryset[offset:offset + options['page_size']]
+            without_indexes = self.measure(queryset=page, use_indexes=False, repeat=options['repeat'])
+            with_indexes = self.measure(queryset=page, use_indexes=True, repeat=options['repeat'])
+            self.stdout.write(f'{name:<16} without indexes {without_indexes:10.2f} ms   '
+                              f'with indexes {with_indexes:10.2f} ms')
+            if options['explain']:
+                self.stdout.write(page.explain(analyze=True))
+
+    @staticmethod
+    def get_querysets() -> Dict[str, QuerySet]:
+        """
+        Возвращает запросы страниц журнала в том виде, в каком их выполняют представления и админка.
+        """
+        newsletter = Newsletter.objects.order_by('pk').only('id', 'created_by_id').first()
+        logs = (
+            NewsletterLog.objects.select_related('newsletter', 'owner', 'client', 'response')
+            .order_by('-date_time', '-pk')
+        )
+        return {
+            'all logs': logs,
+            'owner logs': logs.filter(owner_id=newsletter.created_by_id),
+            'newsletter logs': logs.filter(newsletter_id=newsletter.pk),
+            'failed logs': logs.filter(status='F'),
+        }
+
+    @staticmethod
+    def measure(queryset: QuerySet, use_indexes: bool, repeat: int) -> float:
+        """
+        Возвращает медианное время выполнения запроса в миллисекундах.
+        """
+        sql, params = queryset.query.sql_with_params()
+        timings = []
+        for _ in range(repeat):
+            with transaction.atomic(), connection.cursor() as cursor:
+                if not use_indexes:
+                    cursor.execute('SET LOCAL enable_indexscan = off')
+                    cursor.execute('SET LOCAL enable_indexonlyscan = off')
+                    cursor.execute('SET LOCAL enable_bitmapscan = off')
+                started_at = time.perf_counter()
+                cursor.execute(sql, params)
+                cursor.fetchall()
+                timings.append(time.perf_counter() - started_at)
+        return statistics.median(timings) * 1000
+
+    def populate(self, rows: int) -> None:
+        """
+        Добавляет rows синтетических логов, равномерно распределённых по существующим рассылкам
+        и по последнему году, и обновляет статистику таблицы.
+        """
+        self.stdout.write(f'Inserting {rows} log rows...')
+        response_id = ServerResponseCache.get_id('Письмо успешно доставлено')
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'''
+                WITH newsletters AS (
+                    SELECT array_agg(id ORDER BY id) AS ids, array_agg(created_by_id ORDER BY id) AS owners,
+                           count(*) AS total
+                    FROM {Newsletter._meta.db_table}
+                )
+                INSERT INTO {NewsletterLog._meta.db_table}
+                    (date_time, status, response_id, newsletter_id, owner_id)
+                SELECT now() - random() * interval '365 days',
+                       CASE WHEN random() < 0.95 THEN 'S' ELSE 'F' END,
+                       %s,
+                       newsletters.ids[1 + series.number % newsletters.total],
+                       newsletters.owners[1 + series.number % newsletters.total]
+                FROM generate_series(1, %s) AS series(number), newsletters
+                ''',
+                [response_id, rows]
+            )
+            cursor.execute(f'ANALYZE {NewsletterLog._meta.db_table}')
+        self.stdout.write('Synthetic logs are not counted in delivery statistics, '
+                          'run backfilldeliverystats to include them')
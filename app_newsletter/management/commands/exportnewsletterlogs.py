@@ -0,0 +1,58 @@
+from datetime import date
+
+from django.core.management import BaseCommand, CommandError, CommandParser
+
+from app_newsletter.services import NewsletterLogExportService
+from app_user.models import CustomUser
+
+
+class Command(BaseCommand):
+    """
+    Команда для выгрузки журнала рассылок в CSV или JSONL.
+    Пример команды: 'python manage.py exportnewsletterlogs --owner user@mail.ru --format jsonl --output logs.jsonl'
+    """
+    help = 'Stream newsletter logs to a CSV or JSONL file'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        """
+        Добавляет необходимые аргументы для команды.
+        --owner ограничивает выгрузку рассылками пользователя с указанным email, --newsletter — одной рассылкой,
+        --status — статусом лога, --date-from и --date-to — датами (включительно),
+        --output задаёт файл выгрузки, по умолчанию выгрузка пишется в stdout.
+        """
+        parser.add_argument('--format', choices=NewsletterLogExportService.FORMATS, default='csv',
+                            help='Export format')
+        parser.add_argument('--owner', help='Email of the newsletter owner, all owners by default')
+        parser.add_argument('--newsletter', type=int, help='Newsletter id')
+        parser.add_argument('--status', choices=['S', 'F'], help='Log status')
+        parser.add_argument('--date-from', type=date.fromisoformat, help='First day to export, YYYY-MM-DD')
+        parser.add_argument('--date-to', type=date.fromisoformat, help='Last day to export, YYYY-MM-DD')
+        parser.add_argument('--output', help='Output file, stdout by default')
+
+    def handle(self, *args, **options) -> None:
+        """
+        Обработчик команды. Записывает подходящие логи в файл порциями, не загружая их в память целиком.
+        """
+        owner_id = None
+        if options['owner']:
+            owner_id = CustomUser.objects.filter(email=options['owner']).values_list('pk', flat=True).first()
+            if owner_id is None:
+                raise CommandError(f'User "{options["owner"]}" does not exist')
+
+        export_service = NewsletterLogExportService(
+            owner_id=owner_id,
+            newsletter_id=options['newsletter'],
+            status=options['status'],
+            date_from=options['date_from'],
+            date_to=options['date_to']
+        )
+
+        if not options['output']:
+            for lines in export_service.iter_lines(file_format=options['format']):
+                self.stdout.write(lines, ending='')
+            return
+
+        with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+            for lines in export_service.iter_lines(file_format=options['format']):
+                output.write(lines)
+        self.stdout.write(self.style.SUCCESS(f'Exported newsletter logs to {options["output"]}'))
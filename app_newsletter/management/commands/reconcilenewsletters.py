@@ -0,0 +1,29 @@
+from django.core.management import BaseCommand, CommandParser
+
+from app_newsletter.services import NewsletterScheduleReconciler
+
+
+class Command(BaseCommand):
+    """
+    Команда для сверки расписания рассылок с периодическими задачами Celery beat.
+    Пример команды: 'python manage.py reconcilenewsletters --dry-run'
+    """
+    help = 'Reconcile newsletters with Celery beat periodic tasks'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what would change without saving anything')
+
+    def handle(self, *args, **options) -> None:
+        """
+        Обработчик команды. Удаляет задачи отправки без запущенной рассылки, создаёт недостающие задачи,
+        исправляет устаревшие расписания и выводит количество изменений.
+        """
+        totals = NewsletterScheduleReconciler(dry_run=options['dry_run']).reconcile()
+
+        prefix = 'Dry run:' if options['dry_run'] else 'Reconciled:'
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix} deleted {totals["deleted"]} orphaned tasks, created {totals["created"]} missing tasks, '
+            f'fixed {totals["updated"]} stale schedules, scheduled {totals["scheduled"]} and '
+            f'unscheduled {totals["unscheduled"]} newsletters'
+        ))
@@ -1,37 +1,205 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from queue import Empty
+from typing import Dict, Optional
+
+from django.conf import settings
 from django.core.management import BaseCommand, CommandError, CommandParser
+from django.db import connections
 
 from app_newsletter.models import Newsletter
-from app_newsletter.services import NewsletterDeliveryService
+from app_newsletter.workers import deliver_newsletter, init_worker
+
+
+class NewsletterProgress:
+    """
+    Прогресс отправки одной рассылки: итоги по частям запуска, скорость и оставшееся время.
+    Скорость считается только по письмам, обработанным в этом запуске команды,
+    без учёта уже отправленных в прерванном запуске.
+    """
+
+    def __init__(self, expected: int) -> None:
+        self.expected = expected
+        self.started_at = time.monotonic()
+        self.initial = {}
+        self.current = {}
+
+    def update(self, chunk_id: Optional[int], totals: Dict[str, int]) -> None:
+        processed = totals['sent'] + totals['failed'] + totals['duplicates']
+        self.initial.setdefault(chunk_id, processed)
+        self.current[chunk_id] = totals
+
+    def get_total(self, key: str) -> int:
+        return sum(totals[key] for totals in self.current.values())
+
+    @property
+    def processed(self) -> int:
+        return self.get_total('sent') + self.get_total('failed') + self.get_total('duplicates')
+
+    @property
+    def rate(self) -> float:
+        elapsed = time.monotonic() - self.started_at
+        if elapsed <= 0:
+            return 0.0
+        return (self.processed - sum(self.initial.values())) / elapsed
+
+    @property
+    def eta(self) -> Optional[float]:
+        if not self.rate:
+            return None
+        return max(self.expected - self.processed, 0) / self.rate
 
 
 class Command(BaseCommand):
     """
     Команда для отправки рассылок клиентам.
-    Пример команды: 'python manage.py sendnewsletter 1 2'
+    Пример команды: 'python manage.py sendnewsletter 1 2 --workers 2'
     """
     help = 'Send newsletter to clients'
 
+    progress_interval = 1
+
     def add_arguments(self, parser: CommandParser) -> None:
         """
         Добавляет необходимые аргументы для команды.
         Добавляется аргумент 'newsletter_id', определяющий ID рассылки,
         которую нужно отправить. Аргумент типа int и может быть передан несколько раз.
+        --workers задаёт количество процессов, в которых рассылки отправляются параллельно,
+        --batch-size — размер пачки клиентов, --dry-run выполняет пробный запуск без отправки писем.
         """
         parser.add_argument('newsletter_id', type=int, nargs='+', help='Newsletter ID')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Number of processes delivering newsletters in parallel')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Number of clients loaded and sent per batch')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Render emails and count recipients without sending or saving anything')
 
     def handle(self, *args, **options) -> None:
         """
         Обработчик команды. Вызывается при выполнении команды 'sendnewsletter' с заданными аргументами.
-        В цикле обрабатываются все переданные ID рассылок.
-        Для каждого ID пытается получить объект рассылки из базы данных и вызвать сервис отправки писем.
-        В случае успеха выводит сообщение о успешной отправке рассылки.
-        Если рассылка с указанным ID не найдена, выбрасывает исключение CommandError с соответствующим сообщением.
+        Несуществующие ID рассылок пропускаются, остальные рассылки отправляются в пуле из --workers процессов.
+        Во время отправки выводится строка прогресса по каждой рассылке, в конце — общие итоги.
+        Если какие-то рассылки не найдены или не отправлены, после обработки остальных
+        выбрасывает исключение CommandError с их списком.
         """
-        for newsletter_id in options['newsletter_id']:
+        if options['workers'] < 1:
+            raise CommandError('--workers must be at least 1')
+        if options['batch_size'] is not None and options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        newsletter_ids = list(dict.fromkeys(options['newsletter_id']))
+        existing_ids = set(Newsletter.objects.filter(pk__in=newsletter_ids).values_list('pk', flat=True))
+        failed_ids = [newsletter_id for newsletter_id in newsletter_ids if newsletter_id not in existing_ids]
+        for newsletter_id in failed_ids:
+            self.stderr.write(self.style.ERROR(f'Newsletter "{newsletter_id}" does not exist'))
+
+        newsletter_ids = [newsletter_id for newsletter_id in newsletter_ids if newsletter_id in existing_ids]
+        self.progress = {}
+        self.last_reported_at = {}
+        started_at = time.monotonic()
+        results = {}
+
+        if newsletter_ids:
+            # Дочерние процессы не должны использовать соединение с базой, открытое в родительском
+            connections.close_all()
+            workers = min(options['workers'], len(newsletter_ids))
+            # spawn используется на всех платформах, чтобы пул работал одинаково в Windows, macOS и Linux
+            context = multiprocessing.get_context('spawn')
+            database_names = {connection.alias: connection.settings_dict['NAME'] for connection in connections.all()}
+            with context.Manager() as manager, ProcessPoolExecutor(
+                max_workers=workers, mp_context=context, initializer=init_worker,
+                initargs=(settings.SETTINGS_MODULE, database_names)
+            ) as executor:
+                progress_queue = manager.Queue()
+                futures = {
+                    executor.submit(deliver_newsletter, newsletter_id, options['batch_size'],
+                                    options['dry_run'], progress_queue): newsletter_id
+                    for newsletter_id in newsletter_ids
+                }
+                pending = set(futures)
+                while pending:
+                    self.drain_progress(progress_queue)
+                    done = {future for future in pending if future.done()}
+                    for future in done:
+                        newsletter_id = futures[future]
+                        self.drain_progress(progress_queue)
+                        try:
+                            results[newsletter_id] = future.result()
+                        except Exception as error:
+                            self.stderr.write(self.style.ERROR(f'Newsletter {newsletter_id} failed: {error}'))
+                            failed_ids.append(newsletter_id)
+                            continue
+                        self.report_result(newsletter_id, results[newsletter_id], options['dry_run'])
+                    pending -= done
+
+        self.report_summary(results, time.monotonic() - started_at, options['dry_run'])
+        if failed_ids:
+            raise CommandError(f'Newsletters not sent: {", ".join(map(str, sorted(failed_ids)))}')
+
+    def drain_progress(self, progress_queue) -> None:
+        """
+        Забирает события прогресса от процессов пула и не чаще раза в progress_interval секунд
+        выводит строку прогресса по каждой рассылке.
+        """
+        try:
+            event = progress_queue.get(timeout=0.2)
+        except Empty:
+            return
+        while True:
+            if event[0] == 'start':
+                _, newsletter_id, expected = event
+                self.progress[newsletter_id] = NewsletterProgress(expected=expected)
+            else:
+                _, newsletter_id, chunk_id, totals = event
+                self.progress[newsletter_id].update(chunk_id, totals)
+                self.report_progress(newsletter_id)
             try:
-                newsletter = Newsletter.objects.get(pk=newsletter_id)
-                delivery_service = NewsletterDeliveryService(newsletter=newsletter)
-                delivery_service.send_mail_to_client()
-                self.stdout.write(self.style.SUCCESS(f'Successfully sent newsletter {newsletter_id}'))
-            except Newsletter.DoesNotExist:
-                raise CommandError(f'Newsletter "{newsletter_id}" does not exist')
+                event = progress_queue.get_nowait()
+            except Empty:
+                return
+
+    def report_progress(self, newsletter_id: int) -> None:
+        now = time.monotonic()
+        if now - self.last_reported_at.get(newsletter_id, 0) < self.progress_interval:
+            return
+        self.last_reported_at[newsletter_id] = now
+
+        progress = self.progress[newsletter_id]
+        eta = progress.eta
+        self.stdout.write(
+            f'Newsletter {newsletter_id}: {progress.processed}/{progress.expected} processed, '
+            f'sent {progress.get_total("sent")}, failed {progress.get_total("failed")}, '
+            f'{progress.rate:.1f}/s, ETA {self.format_duration(eta) if eta is not None else "--:--:--"}'
+        )
+
+    def report_result(self, newsletter_id: int, totals: Dict[str, int], dry_run: bool) -> None:
+        if totals['error']:
+            self.stdout.write(self.style.WARNING(f'Newsletter {newsletter_id}: {totals["error"]}'))
+        elif dry_run:
+            self.stdout.write(self.style.SUCCESS(
+                f'Newsletter {newsletter_id} would send {totals["sent"]} emails, '
+                f'{totals["duplicates"]} duplicate addresses skipped'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'Successfully sent newsletter {newsletter_id}: sent {totals["sent"]}, failed {totals["failed"]}, '
+                f'{totals["duplicates"]} duplicate addresses skipped'
+            ))
+
+    def report_summary(self, results: Dict[int, Dict[str, int]], elapsed: float, dry_run: bool) -> None:
+        sent = sum(totals['sent'] for totals in results.values())
+        failed = sum(totals['failed'] for totals in results.values())
+        rate = (sent + failed) / elapsed if elapsed > 0 else 0.0
+        verb = 'would send' if dry_run else 'sent'
+        self.stdout.write(
+            f'Total: {len(results)} newsletters, {verb} {sent}, failed {failed} '
+            f'in {self.format_duration(elapsed)} ({rate:.1f} emails/s)'
+        )
+
+    @staticmethod
+    def format_duration(seconds: float) -> str:
+        minutes, seconds = divmod(int(seconds), 60)
+        hours, minutes = divmod(minutes, 60)
+        return f'{hours:02d}:{minutes:02d}:{seconds:02d}'
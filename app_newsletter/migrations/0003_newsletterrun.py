@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_newsletter', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NewsletterRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('S', 'Запущен'), ('F', 'Завершён')], default='S', max_length=1, verbose_name='Статус')),
+                ('started_at', models.DateTimeField(auto_now_add=True, verbose_name='Начало запуска')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Окончание запуска')),
+                ('sent_count', models.PositiveIntegerField(default=0, verbose_name='Отправлено писем')),
+                ('failed_count', models.PositiveIntegerField(default=0, verbose_name='Ошибок отправки')),
+                ('newsletter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='runs', to='app_newsletter.newsletter', verbose_name='Рассылка')),
+            ],
+            options={
+                'verbose_name': 'Запуск рассылки',
+                'verbose_name_plural': 'Запуски рассылок',
+                'db_table': 'newsletter_runs',
+            },
+        ),
+    ]
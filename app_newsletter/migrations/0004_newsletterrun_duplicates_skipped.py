@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_newsletter', '0003_newsletterrun'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='newsletterrun',
+            name='duplicates_skipped',
+            field=models.PositiveIntegerField(default=0, verbose_name='Пропущено повторяющихся адресов'),
+        ),
+    ]
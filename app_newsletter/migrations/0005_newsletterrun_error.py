@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_newsletter', '0004_newsletterrun_duplicates_skipped'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='newsletterrun',
+            name='error',
+            field=models.TextField(blank=True, verbose_name='Причина прерывания'),
+        ),
+        migrations.AlterField(
+            model_name='newsletterrun',
+            name='status',
+            field=models.CharField(choices=[('S', 'Запущен'), ('F', 'Завершён'), ('A', 'Прерван')], default='S', max_length=1, verbose_name='Статус'),
+        ),
+    ]
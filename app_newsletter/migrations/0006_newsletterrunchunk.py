@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_newsletter', '0005_newsletterrun_error'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NewsletterRunChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_client_id', models.BigIntegerField(blank=True, null=True, verbose_name='Первый id клиента')),
+                ('last_client_id', models.BigIntegerField(blank=True, null=True, verbose_name='Последний id клиента')),
+                ('status', models.CharField(choices=[('S', 'Запущен'), ('F', 'Завершён'), ('A', 'Прерван')], default='S', max_length=1, verbose_name='Статус')),
+                ('checkpoint', models.JSONField(blank=True, default=dict, verbose_name='Последний обработанный id клиента по каждому сообщению')),
+                ('sent_count', models.PositiveIntegerField(default=0, verbose_name='Отправлено писем')),
+                ('failed_count', models.PositiveIntegerField(default=0, verbose_name='Ошибок отправки')),
+                ('duplicates_skipped', models.PositiveIntegerField(default=0, verbose_name='Пропущено повторяющихся адресов')),
+                ('error', models.TextField(blank=True, verbose_name='Причина прерывания')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Последнее сохранение прогресса')),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='app_newsletter.newsletterrun', verbose_name='Запуск')),
+            ],
+            options={
+                'verbose_name': 'Часть запуска рассылки',
+                'verbose_name_plural': 'Части запусков рассылок',
+                'db_table': 'newsletter_run_chunks',
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_message', '0003_message_version'),
+        ('app_client', '0002_initial'),
+        ('app_newsletter', '0006_newsletterrunchunk'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NewsletterRetry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('attempts', models.PositiveIntegerField(default=1, verbose_name='Сделано попыток')),
+                ('next_attempt_at', models.DateTimeField(db_index=True, verbose_name='Следующая попытка')),
+                ('last_error', models.TextField(verbose_name='Последняя ошибка')),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app_client.client', verbose_name='Клиент')),
+                ('message', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app_message.message', verbose_name='Сообщение')),
+                ('newsletter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='retries', to='app_newsletter.newsletter', verbose_name='Рассылка')),
+            ],
+            options={
+                'verbose_name': 'Повтор отправки письма',
+                'verbose_name_plural': 'Очередь повторов отправки',
+                'db_table': 'newsletter_retries',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='newsletterretry',
+            constraint=models.UniqueConstraint(fields=('newsletter', 'message', 'client'), name='unique_newsletter_retry'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:40
+
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def is_run_day(newsletter, run_date: date, created_at: datetime) -> bool:
+    if newsletter.frequency == 'W':
+        return run_date.weekday() == created_at.weekday()
+    if newsletter.frequency == 'M':
+        return run_date.day == min(created_at.day, 28)
+    return True
+
+
+def calculate_next_run_at(newsletter, after: datetime) -> datetime:
+    """
+    Копия NewsletterDeliveryService.calculate_next_run_at на момент миграции:
+    ближайшее после after время запуска в часовом поясе CELERY_TIMEZONE.
+    """
+    tz = ZoneInfo(settings.CELERY_TIMEZONE)
+    after = after.astimezone(tz)
+    created_at = newsletter.created_at.astimezone(tz)
+
+    run_date = after.date()
+    while True:
+        run_at = datetime.combine(run_date, newsletter.time, tzinfo=tz)
+        if run_at > after and is_run_day(newsletter=newsletter, run_date=run_date, created_at=created_at):
+            return run_at
+        run_date += timedelta(days=1)
+
+
+def fill_next_run_at(apps, schema_editor):
+    Newsletter = apps.get_model('app_newsletter', 'Newsletter')
+    now = timezone.now()
+    newsletters = list(Newsletter.objects.filter(is_active=True, status='S'))
+    for newsletter in newsletters:
+        newsletter.next_run_at = calculate_next_run_at(newsletter=newsletter, after=now)
+    Newsletter.objects.bulk_update(newsletters, ['next_run_at'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_newsletter', '0007_newsletterretry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='newsletter',
+            name='next_run_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Следующий запуск'),
+        ),
+        migrations.AddIndex(
+            model_name='newsletter',
+            index=models.Index(condition=models.Q(('is_active', True), ('status', 'S')), fields=['next_run_at'], name='newsletters_next_run_at_idx'),
+        ),
+        migrations.RunPython(fill_next_run_at, migrations.RunPython.noop),
+    ]
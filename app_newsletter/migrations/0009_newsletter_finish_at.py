@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:41
+
+from datetime import datetime
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def fill_finish_at(apps, schema_editor):
+    Newsletter = apps.get_model('app_newsletter', 'Newsletter')
+    newsletters = list(Newsletter.objects.only('id', 'finish_date', 'finish_time'))
+    for newsletter in newsletters:
+        newsletter.finish_at = timezone.make_aware(datetime.combine(newsletter.finish_date, newsletter.finish_time))
+    Newsletter.objects.bulk_update(newsletters, ['finish_at'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_newsletter', '0008_newsletter_next_run_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='newsletter',
+            name='finish_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Завершение рассылки'),
+        ),
+        migrations.AddIndex(
+            model_name='newsletter',
+            index=models.Index(condition=models.Q(('status', 'S')), fields=['finish_at'], name='newsletters_finish_at_idx'),
+        ),
+        migrations.RunPython(fill_finish_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def link_periodic_tasks(apps, schema_editor):
+    """
+    Связывает рассылки с их периодическими задачами, которые раньше находились по имени 'Рассылка #<id>'.
+    """
+    Newsletter = apps.get_model('app_newsletter', 'Newsletter')
+    PeriodicTask = apps.get_model('django_celery_beat', 'PeriodicTask')
+
+    task_ids = dict(
+        PeriodicTask.objects.filter(task='app_newsletter.tasks.send_newsletter').values_list('name', 'pk')
+    )
+    newsletters = list(Newsletter.objects.only('id'))
+    for newsletter in newsletters:
+        newsletter.periodic_task_id = task_ids.get(f'Рассылка #{newsletter.pk}')
+    Newsletter.objects.bulk_update(
+        [newsletter for newsletter in newsletters if newsletter.periodic_task_id], ['periodic_task'], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_celery_beat', '0018_improve_crontab_helptext'),
+        ('app_newsletter', '0009_newsletter_finish_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='newsletter',
+            name='periodic_task',
+            field=models.OneToOneField(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='newsletter', to='django_celery_beat.periodictask', verbose_name='Периодическая задача'),
+        ),
+        migrations.RunPython(link_periodic_tasks, migrations.RunPython.noop),
+    ]
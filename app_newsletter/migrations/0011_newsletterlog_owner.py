@@ -0,0 +1,43 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:45
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+def fill_owner(apps, schema_editor):
+    """
+    Заполняет владельца логов пачками по диапазонам id, чтобы не держать блокировку всей таблицы.
+    """
+    Newsletter = apps.get_model('app_newsletter', 'Newsletter')
+    NewsletterLog = apps.get_model('app_newsletter', 'NewsletterLog')
+
+    last_id = NewsletterLog.objects.order_by('-pk').values_list('pk', flat=True).first()
+    if last_id is None:
+        return
+    owner = Subquery(Newsletter.objects.filter(pk=OuterRef('newsletter_id')).values('created_by_id')[:1])
+    batch_size = 50000
+    for first_id in range(1, last_id + 1, batch_size):
+        NewsletterLog.objects.filter(
+            pk__gte=first_id, pk__lt=first_id + batch_size, owner__isnull=True, newsletter__isnull=False
+        ).update(owner_id=owner)
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('app_newsletter', '0010_newsletter_periodic_task'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='newsletterlog',
+            name='owner',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='newsletter_logs', to=settings.AUTH_USER_MODEL, verbose_name='Владелец рассылки'),
+        ),
+        migrations.RunPython(fill_owner, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:45
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    """
+    Индексы строятся без блокировки записи в таблицу логов (CREATE INDEX CONCURRENTLY).
+    Индекс внешнего ключа newsletter удаляется после построения составного индекса, который его заменяет.
+    """
+
+    atomic = False
+
+    dependencies = [
+        ('app_newsletter', '0011_newsletterlog_owner'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='newsletterlog',
+            index=models.Index(fields=['-date_time', '-id'], name='newsletter_logs_date_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='newsletterlog',
+            index=models.Index(fields=['newsletter', '-date_time', '-id'], name='newsletter_logs_newsletter_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='newsletterlog',
+            index=models.Index(fields=['owner', '-date_time', '-id'], name='newsletter_logs_owner_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='newsletterlog',
+            index=models.Index(fields=['status', '-date_time', '-id'], name='newsletter_logs_status_idx'),
+        ),
+        migrations.AlterField(
+            model_name='newsletterlog',
+            name='newsletter',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='app_newsletter.newsletter', verbose_name='Рассылка'),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:48
+
+import hashlib
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import MD5
+import django.db.models.deletion
+
+
+def fill_response(apps, schema_editor):
+    """
+    Переносит тексты ответов в таблицу server_responses и заполняет ссылки на них пачками по диапазонам id.
+    """
+    NewsletterLog = apps.get_model('app_newsletter', 'NewsletterLog')
+    ServerResponse = apps.get_model('app_newsletter', 'ServerResponse')
+
+    texts = NewsletterLog.objects.values_list('server_response', flat=True).distinct().iterator()
+    ServerResponse.objects.bulk_create(
+        (ServerResponse(digest=hashlib.md5(text.encode()).hexdigest(), text=text) for text in texts),
+        batch_size=1000, ignore_conflicts=True
+    )
+
+    last_id = NewsletterLog.objects.order_by('-pk').values_list('pk', flat=True).first()
+    if last_id is None:
+        return
+    response = Subquery(ServerResponse.objects.filter(digest=MD5(OuterRef('server_response'))).values('pk')[:1])
+    batch_size = 50000
+    for first_id in range(1, last_id + 1, batch_size):
+        NewsletterLog.objects.filter(
+            pk__gte=first_id, pk__lt=first_id + batch_size, response__isnull=True
+        ).update(response_id=response)
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('app_newsletter', '0012_newsletterlog_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ServerResponse',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=32, unique=True, verbose_name='MD5 текста')),
+                ('text', models.TextField(verbose_name='Текст ответа')),
+            ],
+            options={
+                'verbose_name': 'Ответ почтового сервера',
+                'verbose_name_plural': 'Ответы почтового сервера',
+                'db_table': 'server_responses',
+            },
+        ),
+        migrations.AddField(
+            model_name='newsletterlog',
+            name='response',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, to='app_newsletter.serverresponse', verbose_name='Ответ почтового сервера'),
+        ),
+        migrations.RunPython(fill_response, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='newsletterlog',
+            name='server_response',
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:49
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('app_newsletter', '0013_server_response'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NewsletterDeliveryStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('status', models.CharField(choices=[('S', 'Success'), ('F', 'Failure')], max_length=1, verbose_name='Статус')),
+                ('count', models.PositiveBigIntegerField(default=0, verbose_name='Количество')),
+                ('newsletter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='delivery_stats', to='app_newsletter.newsletter', verbose_name='Рассылка')),
+                ('owner', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='delivery_stats', to=settings.AUTH_USER_MODEL, verbose_name='Владелец рассылки')),
+            ],
+            options={
+                'verbose_name': 'Статистика отправки за день',
+                'verbose_name_plural': 'Статистика отправок по дням',
+                'db_table': 'newsletter_delivery_stats',
+                'indexes': [models.Index(fields=['owner', 'day'], name='newsletter_stats_owner_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='newsletterdeliverystats',
+            constraint=models.UniqueConstraint(fields=('newsletter', 'day', 'status'), name='unique_newsletter_delivery_stats'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:02
+
+from django.conf import settings
+from django.db import migrations
+from django.utils import timezone
+
+
+def delete_legacy_send_tasks(apps, schema_editor):
+    """
+    В режиме NEWSLETTER_SCHEDULER = 'dispatcher' рассылки запускает dispatch_due_newsletters,
+    поэтому периодические задачи отправки, созданные для каждой рассылки в режиме 'beat', удаляются.
+    Celery beat узнаёт об изменении расписания по времени в PeriodicTasks.
+    """
+    if settings.NEWSLETTER_SCHEDULER != 'dispatcher':
+        return
+
+    PeriodicTask = apps.get_model('django_celery_beat', 'PeriodicTask')
+    PeriodicTasks = apps.get_model('django_celery_beat', 'PeriodicTasks')
+
+    deleted, _ = PeriodicTask.objects.filter(task='app_newsletter.tasks.send_newsletter').delete()
+    if deleted:
+        PeriodicTasks.objects.update_or_create(ident=1, defaults={'last_update': timezone.now()})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_celery_beat', '0018_improve_crontab_helptext'),
+        ('app_newsletter', '0014_newsletterdeliverystats'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_legacy_send_tasks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_newsletter', '0015_delete_legacy_send_tasks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='newsletterrun',
+            name='dispatch_token',
+            field=models.CharField(blank=True, max_length=32, verbose_name='Блокировка, с которой отправлены части запуска'),
+        ),
+    ]
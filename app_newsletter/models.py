@@ -1,5 +1,10 @@
+from datetime import datetime
+from typing import Optional
+
 from django.db import models
 from django.urls import reverse
+from django.utils import timezone
+from django_celery_beat.models import PeriodicTask
 from app_client.models import Client
 from app_message.models import Message
 from app_user.models import CustomUser
@@ -32,11 +37,20 @@ class Newsletter(models.Model):
     finish_time = models.TimeField(verbose_name='Время завершения рассылки')
     created_by = models.ForeignKey(CustomUser, on_delete=models.CASCADE, verbose_name='Создана',
                                    related_name='newsletters')
+    next_run_at = models.DateTimeField(verbose_name='Следующий запуск', **NULLABLE)
+    finish_at = models.DateTimeField(verbose_name='Завершение рассылки', editable=False, **NULLABLE)
+    periodic_task = models.OneToOneField(PeriodicTask, on_delete=models.SET_NULL, verbose_name='Периодическая задача',
+                                         related_name='newsletter', editable=False, **NULLABLE)
 
     class Meta:
         db_table = 'newsletters'
         verbose_name = 'Рассылка'
         verbose_name_plural = 'Рассылки'
+        indexes = [
+            models.Index(fields=['next_run_at'], name='newsletters_next_run_at_idx',
+                         condition=models.Q(is_active=True, status='S')),
+            models.Index(fields=['finish_at'], name='newsletters_finish_at_idx', condition=models.Q(status='S')),
+        ]
 
     def __str__(self):
         return f"Рассылка #{self.pk}"
@@ -44,12 +58,48 @@ class Newsletter(models.Model):
     def get_absolute_url(self):
         return reverse('app_newsletter:newsletter_detail', args=[str(self.pk)])
 
+    def save(self, *args, **kwargs):
+        """
+        Перед сохранением пересчитывает finish_at из даты и времени завершения рассылки.
+        """
+        self.finish_at = self.get_finish_at()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'finish_date', 'finish_time'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'finish_at'}
+        super().save(*args, **kwargs)
+
+    def get_finish_at(self) -> Optional[datetime]:
+        """
+        Возвращает момент завершения рассылки в часовом поясе TIME_ZONE.
+        """
+        if self.finish_date is None or self.finish_time is None:
+            return None
+        return timezone.make_aware(datetime.combine(self.finish_date, self.finish_time))
+
     def make_inactive(self):
 
         self.is_active = False
         self.save()
 
 
+class ServerResponse(models.Model):
+    """
+    Текст ответа почтового сервера, общий для всех логов с таким ответом.
+    digest — MD5 текста в hex, по нему ответ находят при записи логов.
+    """
+
+    digest = models.CharField(max_length=32, unique=True, verbose_name='MD5 текста')
+    text = models.TextField(verbose_name='Текст ответа')
+
+    class Meta:
+        db_table = 'server_responses'
+        verbose_name = 'Ответ почтового сервера'
+        verbose_name_plural = 'Ответы почтового сервера'
+
+    def __str__(self):
+        return self.text
+
+
 class NewsletterLog(models.Model):
 
     STATUS_CHOICES = [
@@ -59,15 +109,136 @@ class NewsletterLog(models.Model):
 
     date_time = models.DateTimeField(auto_now_add=True, verbose_name='Дата и время')
     status = models.CharField(max_length=1, choices=STATUS_CHOICES, verbose_name='Статус')
-    server_response = models.TextField(verbose_name='Ответ почтового сервера')
+    response = models.ForeignKey(ServerResponse, on_delete=models.PROTECT, verbose_name='Ответ почтового сервера',
+                                 db_index=False, **NULLABLE)
     client = models.ForeignKey(Client, on_delete=models.SET_NULL, verbose_name='Клиент', **NULLABLE)
     message = models.ForeignKey(Message, on_delete=models.SET_NULL, verbose_name='Сообщение', **NULLABLE)
-    newsletter = models.ForeignKey(Newsletter, on_delete=models.CASCADE, verbose_name='Рассылка', **NULLABLE)
+    newsletter = models.ForeignKey(Newsletter, on_delete=models.CASCADE, verbose_name='Рассылка', db_index=False,
+                                   **NULLABLE)
+    owner = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, verbose_name='Владелец рассылки',
+                              related_name='newsletter_logs', db_index=False, **NULLABLE)
 
     class Meta:
         db_table = 'newsletter_logs'
         verbose_name = 'Лог отправки письма'
         verbose_name_plural = 'Логи отправок писем'
+        # Индексы под списки логов: всех, одной рассылки, одного владельца и по статусу,
+        # от новых к старым. id в конце индекса даёт однозначный порядок при одинаковом времени
+        indexes = [
+            models.Index(fields=['-date_time', '-id'], name='newsletter_logs_date_idx'),
+            models.Index(fields=['newsletter', '-date_time', '-id'], name='newsletter_logs_newsletter_idx'),
+            models.Index(fields=['owner', '-date_time', '-id'], name='newsletter_logs_owner_idx'),
+            models.Index(fields=['status', '-date_time', '-id'], name='newsletter_logs_status_idx'),
+        ]
 
     def __str__(self):
         return f'Лог #{self.pk}'
+
+    @property
+    def server_response(self) -> str:
+        return self.response.text if self.response_id else ''
+
+
+class NewsletterDeliveryStats(models.Model):
+    """
+    Количество логов отправки рассылки за день с заданным статусом.
+    Обновляется при каждой записи логов и не уменьшается при архивации старых логов.
+    """
+
+    newsletter = models.ForeignKey(Newsletter, on_delete=models.CASCADE, verbose_name='Рассылка',
+                                   related_name='delivery_stats')
+    owner = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, verbose_name='Владелец рассылки',
+                              related_name='delivery_stats', db_index=False, **NULLABLE)
+    day = models.DateField(verbose_name='День')
+    status = models.CharField(max_length=1, choices=NewsletterLog.STATUS_CHOICES, verbose_name='Статус')
+    count = models.PositiveBigIntegerField(default=0, verbose_name='Количество')
+
+    class Meta:
+        db_table = 'newsletter_delivery_stats'
+        verbose_name = 'Статистика отправки за день'
+        verbose_name_plural = 'Статистика отправок по дням'
+        constraints = [
+            models.UniqueConstraint(fields=['newsletter', 'day', 'status'], name='unique_newsletter_delivery_stats'),
+        ]
+        indexes = [
+            models.Index(fields=['owner', 'day'], name='newsletter_stats_owner_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.newsletter}, {self.day}: {self.get_status_display()} {self.count}'
+
+
+class NewsletterRun(models.Model):
+
+    STATUS_CHOICES = [
+        ('S', 'Запущен'),
+        ('F', 'Завершён'),
+        ('A', 'Прерван')
+    ]
+
+    newsletter = models.ForeignKey(Newsletter, on_delete=models.CASCADE, verbose_name='Рассылка',
+                                   related_name='runs')
+    status = models.CharField(max_length=1, choices=STATUS_CHOICES, default='S', verbose_name='Статус')
+    started_at = models.DateTimeField(auto_now_add=True, verbose_name='Начало запуска')
+    finished_at = models.DateTimeField(verbose_name='Окончание запуска', **NULLABLE)
+    sent_count = models.PositiveIntegerField(default=0, verbose_name='Отправлено писем')
+    failed_count = models.PositiveIntegerField(default=0, verbose_name='Ошибок отправки')
+    duplicates_skipped = models.PositiveIntegerField(default=0, verbose_name='Пропущено повторяющихся адресов')
+    error = models.TextField(blank=True, verbose_name='Причина прерывания')
+    dispatch_token = models.CharField(max_length=32, blank=True, verbose_name='Блокировка, с которой отправлены '
+                                                                               'части запуска')
+
+    class Meta:
+        db_table = 'newsletter_runs'
+        verbose_name = 'Запуск рассылки'
+        verbose_name_plural = 'Запуски рассылок'
+
+    def __str__(self):
+        return f'Запуск #{self.pk} ({self.newsletter})'
+
+
+class NewsletterRunChunk(models.Model):
+
+    STATUS_CHOICES = NewsletterRun.STATUS_CHOICES
+
+    run = models.ForeignKey(NewsletterRun, on_delete=models.CASCADE, verbose_name='Запуск', related_name='chunks')
+    first_client_id = models.BigIntegerField(verbose_name='Первый id клиента', **NULLABLE)
+    last_client_id = models.BigIntegerField(verbose_name='Последний id клиента', **NULLABLE)
+    status = models.CharField(max_length=1, choices=STATUS_CHOICES, default='S', verbose_name='Статус')
+    checkpoint = models.JSONField(default=dict, blank=True, verbose_name='Последний обработанный id клиента '
+                                                                        'по каждому сообщению')
+    sent_count = models.PositiveIntegerField(default=0, verbose_name='Отправлено писем')
+    failed_count = models.PositiveIntegerField(default=0, verbose_name='Ошибок отправки')
+    duplicates_skipped = models.PositiveIntegerField(default=0, verbose_name='Пропущено повторяющихся адресов')
+    error = models.TextField(blank=True, verbose_name='Причина прерывания')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Последнее сохранение прогресса')
+
+    class Meta:
+        db_table = 'newsletter_run_chunks'
+        verbose_name = 'Часть запуска рассылки'
+        verbose_name_plural = 'Части запусков рассылок'
+
+    def __str__(self):
+        return f'Часть #{self.pk} ({self.run})'
+
+
+class NewsletterRetry(models.Model):
+
+    newsletter = models.ForeignKey(Newsletter, on_delete=models.CASCADE, verbose_name='Рассылка',
+                                   related_name='retries')
+    message = models.ForeignKey(Message, on_delete=models.CASCADE, verbose_name='Сообщение')
+    client = models.ForeignKey(Client, on_delete=models.CASCADE, verbose_name='Клиент')
+    attempts = models.PositiveIntegerField(default=1, verbose_name='Сделано попыток')
+    next_attempt_at = models.DateTimeField(db_index=True, verbose_name='Следующая попытка')
+    last_error = models.TextField(verbose_name='Последняя ошибка')
+
+    class Meta:
+        db_table = 'newsletter_retries'
+        verbose_name = 'Повтор отправки письма'
+        verbose_name_plural = 'Очередь повторов отправки'
+        constraints = [
+            models.UniqueConstraint(fields=['newsletter', 'message', 'client'], name='unique_newsletter_retry')
+        ]
+
+    def __str__(self):
+        return f'Повтор #{self.pk}'
@@ -1,73 +1,1013 @@
+import csv
+import gzip
+import hashlib
+import json
 import logging
-from datetime import datetime
+import math
+import re
+import smtplib
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from email.utils import formatdate
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from zoneinfo import ZoneInfo
 
 from django.conf import settings
 from django.contrib import messages
-from django.core.mail import send_mail
+from django.core.mail import EmailMessage, get_connection
+from django.core.mail.message import DNS_NAME, make_msgid, sanitize_address
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Exists, F, Max, OuterRef, Q, QuerySet, Sum
+from django.db.models.functions import Coalesce, Lower, Trim, TruncDate
 from django.http import HttpRequest, HttpResponseRedirect
 from django.shortcuts import redirect
 from django.urls import reverse
 from django.utils import timezone
-from django_celery_beat.models import PeriodicTask, CrontabSchedule
+from django_celery_beat.models import PeriodicTask, PeriodicTasks, CrontabSchedule
 
-from .models import NewsletterLog, Message, Client, Newsletter
+from app_message.services import CompiledMessage, MessageRenderingService
+
+from .coordination import NewsletterRunLock, SMTPRateLimiter
+from .models import (
+    NewsletterLog, Message, Client, Newsletter, NewsletterRun, NewsletterRunChunk, NewsletterRetry, ServerResponse,
+    NewsletterDeliveryStats
+)
 
 logger = logging.getLogger(__name__)
 
+EMAIL_ADDRESS_PATTERN = re.compile(r'[^\s<>()\[\]"\',;:]+@[^\s<>()\[\]"\',;:]+')
+
+
+class SerializedMessage:
+    """
+    Готовое к отправке письмо в виде байтов.
+    Повторяет ту часть интерфейса MIME-сообщения, которой пользуются почтовые бэкенды Django.
+    """
+
+    def __init__(self, data: bytes) -> None:
+        self.data = data
+
+    def as_bytes(self, linesep: str = '\n') -> bytes:
+        if linesep == '\r\n':
+            return self.data
+        return self.data.replace(b'\r\n', linesep.encode())
+
+    def as_string(self, linesep: str = '\n') -> str:
+        return self.as_bytes(linesep=linesep).decode()
+
+    @staticmethod
+    def get_charset() -> None:
+        return None
+
+
+class PreparedEmail:
+    """
+    Письмо без персонализации, MIME-структура которого собирается и кодируется один раз за запуск.
+    Для каждого получателя к готовым байтам добавляются только заголовки To, Date и Message-ID.
+    """
+
+    def __init__(self, subject: str, body: str, from_email: str) -> None:
+        self.subject = subject
+        self.body = body
+        self.from_email = from_email
+        self.encoding = settings.DEFAULT_CHARSET
+
+        mime_message = EmailMessage(subject=subject, body=body, from_email=from_email).message()
+        del mime_message['Date']
+        del mime_message['Message-ID']
+        self.payload = mime_message.as_bytes(linesep='\r\n')
+
+    def for_recipient(self, email: str) -> 'PreparedEmailMessage':
+        return PreparedEmailMessage(prepared_email=self, to=[email])
+
+
+class PreparedEmailMessage(EmailMessage):
+    """
+    Письмо одному получателю на основе PreparedEmail.
+    Отправляется любым почтовым бэкендом Django так же, как обычный EmailMessage.
+    """
+
+    def __init__(self, prepared_email: PreparedEmail, to: List[str]) -> None:
+        super().__init__(subject=prepared_email.subject, body=prepared_email.body,
+                         from_email=prepared_email.from_email, to=to)
+        self.prepared_email = prepared_email
+
+    def message(self) -> SerializedMessage:
+        recipients = ', '.join(sanitize_address(address, self.encoding or settings.DEFAULT_CHARSET)
+                               for address in self.to)
+        headers = (f'To: {recipients}\r\n'
+                   f'Date: {formatdate(localtime=settings.EMAIL_USE_LOCALTIME)}\r\n'
+                   f'Message-ID: {make_msgid(domain=DNS_NAME)}\r\n')
+        return SerializedMessage(headers.encode() + self.prepared_email.payload)
+
+
+class MailTransport:
+    """
+    Отправляет письма через одно соединение с почтовым сервером на весь запуск рассылки.
+    Соединение открывается при первой отправке, а при разрыве сессии сервером
+    транспорт переподключается и повторяет отправку письма.
+    """
+
+    def __init__(self, reconnect_attempts: int = None) -> None:
+        if reconnect_attempts is None:
+            reconnect_attempts = settings.NEWSLETTER_SMTP_RECONNECT_ATTEMPTS
+        self.reconnect_attempts = reconnect_attempts
+        self.connection = get_connection(fail_silently=False)
+        self.is_open = False
+
+    def __enter__(self) -> 'MailTransport':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def open(self) -> None:
+        self.connection.open()
+        self.is_open = True
+
+    def close(self) -> None:
+        if not self.is_open:
+            return
+        self.is_open = False
+        try:
+            self.connection.close()
+        except Exception as error:
+            logger.warning(f'Ошибка при закрытии соединения с почтовым сервером: {error}')
+
+    def reconnect(self) -> None:
+        self.close()
+        self.open()
+
+    def send(self, email: EmailMessage) -> None:
+        """
+        Отправляет письмо через открытое соединение.
+        Если сервер разорвал сессию, переподключается не более reconnect_attempts раз.
+        """
+        if not self.is_open:
+            self.open()
+
+        for attempt in range(self.reconnect_attempts + 1):
+            try:
+                self.connection.send_messages([email])
+                return
+            except (smtplib.SMTPServerDisconnected, smtplib.SMTPResponseException) as error:
+                if not self.is_disconnect_error(error) or attempt == self.reconnect_attempts:
+                    raise
+                logger.warning(f'Почтовый сервер разорвал соединение ({error}), переподключение')
+                self.reconnect()
+
+    @staticmethod
+    def is_disconnect_error(error: Exception) -> bool:
+        if isinstance(error, smtplib.SMTPServerDisconnected):
+            return True
+        return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code == 421
+
+
+class DeliveryAborted(Exception):
+    """
+    Запуск рассылки прерван, потому что почтовый сервер недоступен.
+    """
+
+
+class CircuitOpenError(Exception):
+    """
+    Письмо не отправлялось, потому что сработал предохранитель CircuitBreaker.
+    """
+
+
+class CircuitBreaker:
+    """
+    Предохранитель для соединения с почтовым сервером.
+    Срабатывает после threshold ошибок соединения подряд, после чего письма больше не отправляются,
+    а запуск рассылки прерывается. Успешная отправка или ошибка, не связанная с соединением,
+    обнуляет счётчик.
+    """
+
+    def __init__(self, threshold: int = None) -> None:
+        self.threshold = threshold or settings.NEWSLETTER_CIRCUIT_BREAKER_THRESHOLD
+        self.consecutive_errors = 0
+        self.last_error = None
+        self.is_open = False
+        self.lock = threading.Lock()
+
+    def record_success(self) -> None:
+        with self.lock:
+            self.consecutive_errors = 0
+
+    def record_error(self, error: Exception) -> None:
+        with self.lock:
+            if not self.is_connection_error(error):
+                self.consecutive_errors = 0
+                return
+            self.consecutive_errors += 1
+            self.last_error = error
+            if self.consecutive_errors >= self.threshold and not self.is_open:
+                self.is_open = True
+                logger.error(f'Почтовый сервер недоступен: {self.consecutive_errors} ошибок соединения подряд')
+
+    @staticmethod
+    def is_connection_error(error: Exception) -> bool:
+        if isinstance(error, (smtplib.SMTPConnectError, smtplib.SMTPServerDisconnected)):
+            return True
+        return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+
+class ConcurrentDeliveryEngine:
+    """
+    Отправляет письма пулом из concurrency потоков, у каждого потока своё соединение
+    с почтовым сервером. Результаты отправки возвращаются в том же порядке, что и письма.
+    Скорость отправки всех потоков ограничивается общим для воркеров SMTPRateLimiter,
+    а при недоступности сервера отправку останавливает CircuitBreaker.
+    """
+
+    def __init__(self, concurrency: int = None) -> None:
+        self.concurrency = concurrency or settings.NEWSLETTER_DELIVERY_CONCURRENCY
+        self.rate_limiter = SMTPRateLimiter()
+        self.circuit_breaker = CircuitBreaker()
+        self.local = threading.local()
+        self.transports = []
+        self.transports_lock = threading.Lock()
+        self.executor = None
+
+    def __enter__(self) -> 'ConcurrentDeliveryEngine':
+        if self.concurrency > 1:
+            self.executor = ThreadPoolExecutor(max_workers=self.concurrency,
+                                               thread_name_prefix='newsletter-delivery')
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+        for transport in self.transports:
+            transport.close()
+        self.transports = []
+
+    def get_transport(self) -> MailTransport:
+        transport = getattr(self.local, 'transport', None)
+        if transport is None:
+            transport = MailTransport()
+            self.local.transport = transport
+            with self.transports_lock:
+                self.transports.append(transport)
+        return transport
+
+    def send(self, email: EmailMessage) -> Optional[Exception]:
+        """
+        Отправляет письмо через соединение текущего потока.
+        Возвращает ошибку отправки или None, если письмо отправлено.
+        Если предохранитель сработал, письмо не отправляется и возвращается CircuitOpenError.
+        """
+        if self.circuit_breaker.is_open:
+            return CircuitOpenError('Письмо не отправлялось: почтовый сервер недоступен')
+        try:
+            self.rate_limiter.acquire()
+            self.get_transport().send(email)
+        except Exception as error:
+            if self.rate_limiter.is_throttling_error(error):
+                self.rate_limiter.penalize()
+            self.circuit_breaker.record_error(error)
+            return error
+        self.circuit_breaker.record_success()
+        return None
+
+    def send_many(self, emails: List[EmailMessage]) -> List[Optional[Exception]]:
+        if self.executor is None:
+            return [self.send(email) for email in emails]
+        return list(self.executor.map(self.send, emails))
+
+
+class NewsletterLogBuffer:
+    """
+    Накапливает логи отправки писем и записывает их в базу пачками через bulk_create
+    вместе с приращением статистики отправок (см. DeliveryStatsService).
+    Запись нужна, когда в буфере набралось max_size записей или с прошлой записи
+    прошло больше flush_interval секунд. Буфер сбрасывается и при выходе из контекста,
+    в том числе по ошибке.
+    """
+
+    def __init__(self, max_size: int = None, flush_interval: float = None) -> None:
+        self.max_size = max_size or settings.NEWSLETTER_LOG_BUFFER_SIZE
+        self.flush_interval = flush_interval or settings.NEWSLETTER_LOG_FLUSH_INTERVAL
+        self.logs = []
+        self.last_flush = time.monotonic()
+
+    def __enter__(self) -> 'NewsletterLogBuffer':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.flush()
+
+    def add(self, newsletter_log: NewsletterLog) -> None:
+        self.logs.append(newsletter_log)
+
+    def is_flush_due(self) -> bool:
+        return len(self.logs) >= self.max_size or time.monotonic() - self.last_flush >= self.flush_interval
+
+    def flush(self) -> None:
+        if self.logs:
+            with transaction.atomic():
+                NewsletterLog.objects.bulk_create(self.logs, batch_size=self.max_size)
+                DeliveryStatsService.record(logs=self.logs)
+            logger.debug(f'Записано логов отправки: {len(self.logs)}')
+            self.logs = []
+        self.last_flush = time.monotonic()
+
+
+class ServerResponseCache:
+    """
+    Кеш id ответов почтового сервера в памяти процесса.
+    Повторяющиеся ответы (успешная доставка, типовые ошибки) находятся в базе один раз за процесс,
+    после чего логи записываются без дополнительных запросов.
+    """
+
+    cache = OrderedDict()
+    cache_lock = threading.Lock()
+
+    @classmethod
+    def get_id(cls, text: str) -> int:
+        """
+        Возвращает id ответа с заданным текстом, создавая ответ при необходимости.
+        """
+        digest = hashlib.md5(text.encode()).hexdigest()
+        with cls.cache_lock:
+            response_id = cls.cache.get(digest)
+            if response_id is not None:
+                cls.cache.move_to_end(digest)
+                return response_id
+
+        response, _ = ServerResponse.objects.get_or_create(digest=digest, defaults={'text': text})
+        transaction.on_commit(lambda: cls.remember(digest=digest, response_id=response.pk))
+        return response.pk
+
+    @classmethod
+    def remember(cls, digest: str, response_id: int) -> None:
+        with cls.cache_lock:
+            cls.cache[digest] = response_id
+            cls.cache.move_to_end(digest)
+            while len(cls.cache) > settings.NEWSLETTER_SERVER_RESPONSE_CACHE_SIZE:
+                cls.cache.popitem(last=False)
+
+
+class DeliveryStatsService:
+    """
+    Статистика отправок по дням в таблице newsletter_delivery_stats.
+    Счётчики увеличиваются при каждой записи логов, поэтому количество отправленных писем
+    и ошибок читается без подсчёта строк newsletter_logs.
+    """
+
+    @classmethod
+    def record(cls, logs: List[NewsletterLog]) -> None:
+        """
+        Увеличивает счётчики на количество записанных логов.
+        Логи группируются по рассылке, дню и статусу, так что на пачку логов приходится
+        по одному запросу на каждый счётчик. Счётчики обновляются в одном порядке,
+        чтобы параллельные части запуска не блокировали друг друга взаимно.
+        Логи без клиента (запись о прерванном запуске) письмами не являются и не считаются.
+        """
+        counts = Counter(
+            (log.newsletter_id, log.owner_id, timezone.localdate(log.date_time), log.status)
+            for log in logs if log.newsletter_id is not None and log.client_id is not None
+        )
+        for (newsletter_id, owner_id, day, status), count in sorted(counts.items()):
+            cls.increment(newsletter_id=newsletter_id, owner_id=owner_id, day=day, status=status, count=count)
+
+    @staticmethod
+    def increment(newsletter_id: int, owner_id: Optional[int], day: date, status: str, count: int) -> None:
+        """
+        Атомарно увеличивает счётчик на count, создавая его при первой записи за день.
+        Если счётчик одновременно создал другой процесс, увеличивает уже созданный.
+        """
+        stats = NewsletterDeliveryStats.objects.filter(newsletter_id=newsletter_id, day=day, status=status)
+        if stats.update(count=F('count') + count):
+            return
+        try:
+            with transaction.atomic():
+                NewsletterDeliveryStats.objects.create(newsletter_id=newsletter_id, owner_id=owner_id, day=day,
+                                                       status=status, count=count)
+        except IntegrityError:
+            stats.update(count=F('count') + count)
+
+    @staticmethod
+    def get_totals(stats: QuerySet) -> Dict[str, int]:
+        return stats.aggregate(
+            sent=Coalesce(Sum('count', filter=Q(status='S')), 0),
+            failed=Coalesce(Sum('count', filter=Q(status='F')), 0),
+        )
+
+    @classmethod
+    def get_newsletter_totals(cls, newsletter: Newsletter) -> Dict[str, int]:
+        """
+        Возвращает количество отправленных писем и ошибок отправки рассылки за всё время.
+        """
+        return cls.get_totals(stats=NewsletterDeliveryStats.objects.filter(newsletter=newsletter))
+
+    @classmethod
+    def get_owner_totals(cls, owner_id: int) -> Dict[str, int]:
+        """
+        Возвращает количество отправленных писем и ошибок отправки всех рассылок пользователя.
+        """
+        return cls.get_totals(stats=NewsletterDeliveryStats.objects.filter(owner_id=owner_id))
+
+    @staticmethod
+    def rebuild(newsletter_ids: List[int]) -> int:
+        """
+        Пересчитывает статистику рассылок newsletter_ids по их логам в newsletter_logs.
+        Счётчики за дни до первого сохранившегося лога рассылки (и счётчики рассылок без логов)
+        не меняются, чтобы не потерять статистику логов, перенесённых в архив.
+        Первый день с логами мог попасть в архив частично (archivenewsletterlogs отсекает логи
+        не по границе дня), поэтому уже существующие счётчики этого дня тоже не меняются,
+        а недостающие создаются по логам.
+        Записи о прерванных запусках не имеют ни клиента, ни сообщения и не считаются;
+        у логов писем клиент или сообщение пропадают, только если их удалили.
+        Возвращает количество созданных счётчиков.
+        """
+        rows = list(
+            NewsletterLog.objects.filter(newsletter_id__in=newsletter_ids)
+            .exclude(client__isnull=True, message__isnull=True)
+            .values('newsletter_id', 'status', day=TruncDate('date_time'))
+            .annotate(log_owner_id=Max('owner_id'), total=Count('id'))
+            .order_by()
+        )
+        if not rows:
+            return 0
+
+        first_days = {}
+        for row in rows:
+            first_day = first_days.get(row['newsletter_id'])
+            if first_day is None or row['day'] < first_day:
+                first_days[row['newsletter_id']] = row['day']
+
+        outdated = Q()
+        first_day_stats = Q()
+        for newsletter_id, first_day in first_days.items():
+            outdated |= Q(newsletter_id=newsletter_id, day__gt=first_day)
+            first_day_stats |= Q(newsletter_id=newsletter_id, day=first_day)
+
+        with transaction.atomic():
+            NewsletterDeliveryStats.objects.filter(outdated).delete()
+            kept = set(
+                NewsletterDeliveryStats.objects.filter(first_day_stats).values_list('newsletter_id', 'day', 'status')
+            )
+            created = NewsletterDeliveryStats.objects.bulk_create(
+                NewsletterDeliveryStats(newsletter_id=row['newsletter_id'], owner_id=row['log_owner_id'],
+                                        day=row['day'], status=row['status'], count=row['total'])
+                for row in rows
+                if (row['newsletter_id'], row['day'], row['status']) not in kept
+            )
+        return len(created)
+
 
 class NewsletterDeliveryService:
 
-    def __init__(self, newsletter: Newsletter) -> None:
+    def __init__(self, newsletter: Newsletter, batch_size: int = None,
+                 progress_callback: Callable[[Optional[int], Dict[str, int]], None] = None) -> None:
+        """
+        progress_callback, если передан, вызывается в начале отправки каждой части запуска и после каждой пачки
+        с id части и текущими итогами этой части. Через него команда sendnewsletter показывает прогресс.
+        """
         self.newsletter = newsletter
+        self.batch_size = batch_size or settings.NEWSLETTER_DELIVERY_BATCH_SIZE
+        self.progress_callback = progress_callback
+        self.log_buffer = NewsletterLogBuffer()
+        self.pending_retries = []
 
-    def send_mail_to_client(self):
+    def send_mail_to_client(self) -> Dict[str, int]:
+        """
+        Отправляет рассылку всем её клиентам в текущем процессе и фиксирует итоги запуска.
+        Если предыдущий запуск не был завершён, продолжает его с сохранённого места.
+        Если рассылку уже отправляет другой процесс, новый запуск не начинается.
+        """
         if self.check_task_finish_datetime():
             self.delete_task()
-            return
+            return self.empty_totals()
 
-        messages = self.newsletter.messages.all()
-        clients = self.newsletter.clients.all()
-
-        for message in messages:
-            for client in clients:
-                try:
-                    logger.info(f'Отправка письма для {client} {client.email}')
-                    send_mail(
-                        subject=message.subject,
-                        message=message.body,
-                        from_email=settings.EMAIL_HOST_USER,
-                        recipient_list=[client.email]
-                    )
-                    self.save_newsletter_log(
-                        status='S',
-                        service_response='Письмо успешно доставлено',
-                        message=message,
-                        client=client
+        run_lock = NewsletterRunLock(newsletter_id=self.newsletter.pk)
+        if not run_lock.acquire():
+            logger.info(f'{self.newsletter} уже отправляется, повторный запуск пропущен')
+            totals = self.empty_totals()
+            totals['error'] = f'{self.newsletter} уже отправляется другим процессом'
+            return totals
+
+        try:
+            with run_lock.heartbeat():
+                run = self.start_run()
+                # Подзадачи Celery, которые ещё ждут в очереди с прежней блокировкой, этот запуск не отправят
+                run.dispatch_token = run_lock.token
+                run.save(update_fields=['dispatch_token'])
+                if not run.chunks.exists():
+                    self.create_chunks(run=run, client_id_ranges=[(None, None)])
+
+                for chunk in run.chunks.exclude(status='F'):
+                    self.deliver(chunk=chunk)
+
+                return self.finish_run(run=run)
+        finally:
+            run_lock.release()
+
+    def deliver(self, chunk: NewsletterRunChunk) -> Dict[str, int]:
+        """
+        Отправляет сообщения рассылки клиентам, чей id лежит в диапазоне части запуска.
+        Часть без границ диапазона охватывает всех клиентов рассылки.
+
+        После каждой записи логов в базу в той же транзакции сохраняется прогресс части:
+        id последнего обработанного клиента по каждому сообщению. Повторный вызов для той же части
+        (перезапуск или повтор задачи Celery) продолжает отправку с этого места.
+        Возвращает количество успешных и неудачных отправок части.
+        """
+        totals = {
+            'sent': chunk.sent_count,
+            'failed': chunk.failed_count,
+            'duplicates': chunk.duplicates_skipped,
+            'error': '',
+        }
+        messages = list(self.newsletter.messages.order_by('pk'))
+        chunk.status = 'S'
+        self.report_progress(chunk_id=chunk.pk, totals=totals)
+
+        try:
+            with ConcurrentDeliveryEngine() as engine:
+                for message in messages:
+                    compiled_message = MessageRenderingService.get_compiled(message)
+                    prepared_email = self.prepare_email(compiled_message=compiled_message)
+                    batches = self.iter_client_batches(
+                        first_client_id=chunk.first_client_id,
+                        last_client_id=chunk.last_client_id,
+                        after_client_id=chunk.checkpoint.get(str(message.pk))
                     )
-                    logger.info('Письмо отправлено')
-                except Exception as error:
-                    logger.error(f'Ошибка отправки письма: {error}')
-                    self.save_newsletter_log(
-                        status='F',
-                        service_response=str(error),
+                    for batch in batches:
+                        clients = self.skip_duplicate_recipients(clients=batch, totals=totals)
+                        results = self.deliver_batch(engine=engine, message=message,
+                                                     compiled_message=compiled_message,
+                                                     prepared_email=prepared_email, clients=clients, totals=totals)
+                        self.queue_retries(message=message, results=results)
+                        chunk.checkpoint[str(message.pk)] = batch[-1].pk
+                        self.check_circuit_breaker(engine=engine)
+                        if self.log_buffer.is_flush_due():
+                            self.save_progress(chunk=chunk, totals=totals)
+                        self.report_progress(chunk_id=chunk.pk, totals=totals)
+            chunk.status = 'F'
+        except DeliveryAborted as error:
+            chunk.status = 'A'
+            totals['error'] = str(error)
+            self.save_newsletter_log(status='F', service_response=totals['error'], message=None, client=None)
+        finally:
+            self.save_progress(chunk=chunk, totals=totals)
+
+        if totals['duplicates']:
+            logger.info(f'{self.newsletter}: пропущено повторяющихся адресов: {totals["duplicates"]}')
+        return totals
+
+    def preview(self) -> Dict[str, int]:
+        """
+        Пробный запуск: проходит по всем клиентам рассылки так же, как отправка,
+        и собирает письма, но ничего не отправляет и ничего не записывает в базу.
+        В итогах 'sent' — количество писем, которые были бы отправлены.
+        """
+        totals = self.empty_totals()
+        self.report_progress(chunk_id=None, totals=totals)
+        for message in self.newsletter.messages.order_by('pk'):
+            compiled_message = MessageRenderingService.get_compiled(message)
+            prepared_email = self.prepare_email(compiled_message=compiled_message)
+            for batch in self.iter_client_batches():
+                clients = self.skip_duplicate_recipients(clients=batch, totals=totals)
+                for client in clients:
+                    self.build_email(compiled_message=compiled_message, prepared_email=prepared_email,
+                                     client=client)
+                totals['sent'] += len(clients)
+                self.report_progress(chunk_id=None, totals=totals)
+        return totals
+
+    def count_deliveries(self) -> int:
+        """
+        Возвращает количество писем в полном запуске рассылки, включая повторяющиеся адреса.
+        """
+        return self.newsletter.clients.count() * self.newsletter.messages.count()
+
+    def report_progress(self, chunk_id: Optional[int], totals: Dict[str, int]) -> None:
+        if self.progress_callback is not None:
+            self.progress_callback(chunk_id, totals)
+
+    def save_progress(self, chunk: NewsletterRunChunk, totals: Dict[str, int]) -> None:
+        """
+        Записывает накопленные логи, повторы отправки и прогресс части запуска в одной транзакции,
+        чтобы сохранённое место продолжения всегда соответствовало записанным логам.
+        """
+        chunk.sent_count = totals['sent']
+        chunk.failed_count = totals['failed']
+        chunk.duplicates_skipped = totals['duplicates']
+        chunk.error = totals['error']
+        with transaction.atomic():
+            self.log_buffer.flush()
+            NewsletterRetry.objects.bulk_create(self.pending_retries, ignore_conflicts=True)
+            self.pending_retries = []
+            chunk.save(update_fields=['status', 'checkpoint', 'sent_count', 'failed_count',
+                                      'duplicates_skipped', 'error', 'updated_at'])
+
+    @staticmethod
+    def skip_duplicate_recipients(clients: List[Client], totals: Dict[str, int]) -> List[Client]:
+        """
+        Убирает из пачки клиентов с повторяющимся адресом (см. iter_client_batches).
+        Пропущенные адреса не логируются по отдельности, а только учитываются в итогах запуска.
+        """
+        unique_clients = [client for client in clients if not client.is_duplicate]
+        totals['duplicates'] += len(clients) - len(unique_clients)
+        return unique_clients
+
+    def iter_client_batches(self, first_client_id: Optional[int] = None, last_client_id: Optional[int] = None,
+                            after_client_id: Optional[int] = None) -> Iterator[List[Client]]:
+        """
+        Выбирает клиентов рассылки пачками по batch_size (по умолчанию NEWSLETTER_DELIVERY_BATCH_SIZE)
+        в порядке возрастания id,
+        начиная с клиента, следующего за after_client_id.
+        Каждая следующая пачка запрашивается по id последнего клиента предыдущей,
+        а из таблицы клиентов загружаются только поля, нужные для письма,
+        поэтому память процесса не растёт с размером рассылки.
+
+        У каждого клиента отмечено is_duplicate: у рассылки есть клиент с меньшим id и тем же адресом
+        (без пробелов по краям, в нижнем регистре). Письмо получает только клиент с наименьшим id,
+        поэтому повторяющиеся адреса пропускаются одинаково во всех частях запуска и при его продолжении.
+        """
+        batch_size = self.batch_size
+        earlier_duplicates = (
+            Client.objects.filter(newsletters=self.newsletter, pk__lt=OuterRef('pk'))
+            .annotate(normalized_email=Lower(Trim('email')))
+            .filter(normalized_email=OuterRef('normalized_email'))
+        )
+        clients = (
+            self.newsletter.clients.only('id', 'email', 'first_name', 'last_name', 'middle_name')
+            .annotate(normalized_email=Lower(Trim('email')), is_duplicate=Exists(earlier_duplicates))
+        )
+        if first_client_id is not None:
+            clients = clients.filter(pk__gte=first_client_id)
+        if last_client_id is not None:
+            clients = clients.filter(pk__lte=last_client_id)
+        clients = clients.order_by('pk')
+
+        if after_client_id is not None:
+            batch = list(clients.filter(pk__gt=after_client_id)[:batch_size])
+        else:
+            batch = list(clients[:batch_size])
+        while batch:
+            yield batch
+            if len(batch) < batch_size:
+                return
+            batch = list(clients.filter(pk__gt=batch[-1].pk)[:batch_size])
+
+    def deliver_batch(self, engine: ConcurrentDeliveryEngine, message: Message, compiled_message: CompiledMessage,
+                      prepared_email: Optional[PreparedEmail], clients: List[Client],
+                      totals: Dict[str, int]) -> List[Tuple[Client, Optional[Exception]]]:
+        """
+        Параллельно отправляет сообщение пачке клиентов и записывает логи в порядке клиентов.
+        Возвращает результаты отправки всем клиентам пачки. Письма, которые не отправлялись
+        из-за сработавшего предохранителя, не логируются и возвращаются с ошибкой CircuitOpenError.
+        """
+        if not clients:
+            return []
+
+        logger.info(f'Отправка письма "{message}" для {len(clients)} клиентов')
+        emails = [
+            self.build_email(compiled_message=compiled_message, prepared_email=prepared_email, client=client)
+            for client in clients
+        ]
+        errors = engine.send_many(emails)
+
+        results = []
+        for client, error in zip(clients, errors):
+            results.append((client, error))
+            if isinstance(error, CircuitOpenError):
+                continue
+            if error is None:
+                self.save_newsletter_log(
+                    status='S',
+                    service_response='Письмо успешно доставлено',
+                    message=message,
+                    client=client
+                )
+                totals['sent'] += 1
+            else:
+                logger.error(f'Ошибка отправки письма для {client} {client.email}: {error}')
+                self.save_newsletter_log(
+                    status='F',
+                    service_response=self.get_server_response(error),
+                    message=message,
+                    client=client
+                )
+                totals['failed'] += 1
+
+        return results
+
+    @staticmethod
+    def check_circuit_breaker(engine: ConcurrentDeliveryEngine) -> None:
+        circuit_breaker = engine.circuit_breaker
+        if circuit_breaker.is_open:
+            raise DeliveryAborted(
+                f'Рассылка прервана: почтовый сервер недоступен, '
+                f'{circuit_breaker.consecutive_errors} ошибок соединения подряд. '
+                f'Последняя ошибка: {circuit_breaker.last_error}'
+            )
+
+    def queue_retries(self, message: Message, results: List[Tuple[Client, Optional[Exception]]]) -> None:
+        """
+        Ставит в очередь повторов письма, которые не удалось отправить из-за временной ошибки
+        или которые не отправлялись из-за сработавшего предохранителя.
+        Потоки пула могут начать отправку не по порядку писем, поэтому неотправленные письма
+        могут оказаться между отправленными: очередь повторов позволяет продолжить часть запуска
+        с конца пачки, не отправляя письма повторно. Записываются в базу вместе с логами при сохранении прогресса.
+        """
+        next_attempt_at = timezone.now() + timedelta(seconds=self.get_retry_delay(attempts=1))
+        for client, error in results:
+            if isinstance(error, CircuitOpenError) or error is not None and self.is_transient_error(error):
+                self.pending_retries.append(NewsletterRetry(
+                    newsletter=self.newsletter,
+                    message=message,
+                    client=client,
+                    next_attempt_at=next_attempt_at,
+                    last_error=str(error)
+                ))
+
+    def retry_failed_deliveries(self, retries: List[NewsletterRetry]) -> Dict[str, int]:
+        """
+        Повторно отправляет письма из очереди повторов этой рассылки.
+        Отправленные письма и письма с постоянной ошибкой удаляются из очереди,
+        а после временной ошибки следующая попытка откладывается экспоненциально,
+        пока не исчерпано NEWSLETTER_RETRY_MAX_ATTEMPTS попыток.
+        """
+        totals = self.empty_totals()
+        retries_by_pair = {(retry.message_id, retry.client_id): retry for retry in retries}
+        results_by_pair = {}
+
+        try:
+            with ConcurrentDeliveryEngine() as engine:
+                messages = {retry.message_id: retry.message for retry in retries}
+                for message_id, message in messages.items():
+                    compiled_message = MessageRenderingService.get_compiled(message)
+                    clients = [retry.client for retry in retries if retry.message_id == message_id]
+                    results = self.deliver_batch(
+                        engine=engine,
                         message=message,
-                        client=client
+                        compiled_message=compiled_message,
+                        prepared_email=self.prepare_email(compiled_message=compiled_message),
+                        clients=clients,
+                        totals=totals
                     )
+                    for client, error in results:
+                        # Неотправленные письма остаются в очереди и снова забираются после аренды
+                        if not isinstance(error, CircuitOpenError):
+                            results_by_pair[(message_id, client.pk)] = error
+                    self.check_circuit_breaker(engine=engine)
+        except DeliveryAborted as error:
+            totals['error'] = str(error)
+            logger.error(f'{self.newsletter}: повтор отправки прерван. {error}')
+
+        finished_ids = []
+        retries_to_update = []
+        now = timezone.now()
+        for pair, error in results_by_pair.items():
+            retry = retries_by_pair[pair]
+            retry.attempts += 1
+            if error is None or not self.is_transient_error(error) \
+                    or retry.attempts >= settings.NEWSLETTER_RETRY_MAX_ATTEMPTS:
+                finished_ids.append(retry.pk)
+                continue
+            retry.last_error = str(error)
+            retry.next_attempt_at = now + timedelta(seconds=self.get_retry_delay(attempts=retry.attempts))
+            retries_to_update.append(retry)
+
+        with transaction.atomic():
+            self.log_buffer.flush()
+            NewsletterRetry.objects.filter(pk__in=finished_ids).delete()
+            NewsletterRetry.objects.bulk_update(retries_to_update, ['attempts', 'next_attempt_at', 'last_error'])
+
+        logger.info(
+            f'{self.newsletter}: повтор отправки: отправлено {totals["sent"]}, ошибок {totals["failed"]}, '
+            f'отложено {len(retries_to_update)}'
+        )
+        return totals
+
+    @staticmethod
+    def claim_due_retries(limit: int = None) -> List[NewsletterRetry]:
+        """
+        Забирает из очереди повторы, время которых наступило.
+        Следующая попытка забранных повторов сдвигается на NEWSLETTER_RETRY_LEASE секунд,
+        чтобы параллельный обработчик очереди не отправил их второй раз.
+        """
+        limit = limit or settings.NEWSLETTER_RETRY_BATCH_SIZE
+        now = timezone.now()
+        with transaction.atomic():
+            retry_ids = list(
+                NewsletterRetry.objects.select_for_update(skip_locked=True)
+                .filter(next_attempt_at__lte=now)
+                .order_by('next_attempt_at')
+                .values_list('pk', flat=True)[:limit]
+            )
+            NewsletterRetry.objects.filter(pk__in=retry_ids).update(
+                next_attempt_at=now + timedelta(seconds=settings.NEWSLETTER_RETRY_LEASE)
+            )
+        return list(
+            NewsletterRetry.objects.filter(pk__in=retry_ids)
+            .select_related('newsletter', 'message', 'client')
+            .order_by('newsletter_id', 'message_id', 'client_id')
+        )
+
+    @staticmethod
+    def get_retry_delay(attempts: int) -> int:
+        delay = settings.NEWSLETTER_RETRY_BASE_DELAY * 2 ** (attempts - 1)
+        return min(delay, settings.NEWSLETTER_RETRY_MAX_DELAY)
+
+    @staticmethod
+    def get_server_response(error: Exception) -> str:
+        """
+        Возвращает текст ошибки отправки для лога: код и ответ почтового сервера без адресов.
+        Адрес получателя известен из клиента лога, а без него одинаковые ответы сервера
+        хранятся в server_responses одной строкой и находятся в кеше ServerResponseCache.
+        """
+        if isinstance(error, smtplib.SMTPRecipientsRefused):
+            responses = sorted({(code, NewsletterDeliveryService.decode_smtp_text(text))
+                                for code, text in error.recipients.values()})
+            response = '; '.join(f'{code} {text}' for code, text in responses)
+        elif isinstance(error, smtplib.SMTPResponseException):
+            response = f'{error.smtp_code} {NewsletterDeliveryService.decode_smtp_text(error.smtp_error)}'
+        else:
+            response = str(error)
+        return EMAIL_ADDRESS_PATTERN.sub('***', response)
+
+    @staticmethod
+    def decode_smtp_text(text: Any) -> str:
+        return text.decode(errors='replace') if isinstance(text, bytes) else str(text)
+
+    @staticmethod
+    def is_transient_error(error: Exception) -> bool:
+        """
+        Временные ошибки (ответы сервера 4xx и проблемы соединения) имеет смысл повторить,
+        постоянные (5xx, некорректное письмо или адрес) — нет.
+        """
+        if isinstance(error, smtplib.SMTPRecipientsRefused):
+            return all(400 <= code < 500 for code, _ in error.recipients.values())
+        if isinstance(error, smtplib.SMTPResponseException):
+            return 400 <= error.smtp_code < 500
+        if isinstance(error, smtplib.SMTPServerDisconnected):
+            return True
+        return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+    def get_client_id_ranges(self) -> List[Tuple[int, int]]:
+        """
+        Делит клиентов рассылки на диапазоны id для параллельной отправки.
+        Размер диапазона не меньше NEWSLETTER_CHUNK_SIZE и подбирается так,
+        чтобы диапазонов было не больше NEWSLETTER_MAX_PARALLEL_CHUNKS.
+        """
+        total_clients = self.newsletter.clients.count()
+        chunk_size = max(
+            settings.NEWSLETTER_CHUNK_SIZE,
+            math.ceil(total_clients / settings.NEWSLETTER_MAX_PARALLEL_CHUNKS)
+        )
+        client_ids = self.newsletter.clients.order_by('pk').values_list('pk', flat=True)
+
+        ranges = []
+        first_client_id = last_client_id = None
+        for index, client_id in enumerate(client_ids.iterator(chunk_size=chunk_size)):
+            if index % chunk_size == 0:
+                if first_client_id is not None:
+                    ranges.append((first_client_id, last_client_id))
+                first_client_id = client_id
+            last_client_id = client_id
+
+        if first_client_id is not None:
+            ranges.append((first_client_id, last_client_id))
+        return ranges
+
+    def start_run(self) -> NewsletterRun:
+        """
+        Возвращает незавершённый запуск рассылки, начатый не раньше NEWSLETTER_RUN_RESUME_WINDOW секунд назад,
+        чтобы продолжить его, или создаёт новый запуск.
+        """
+        resume_after = timezone.now() - timedelta(seconds=settings.NEWSLETTER_RUN_RESUME_WINDOW)
+        run = self.newsletter.runs.filter(
+            status__in=['S', 'A'], started_at__gte=resume_after
+        ).order_by('-started_at').first()
+
+        if run is None:
+            return NewsletterRun.objects.create(newsletter=self.newsletter)
+
+        logger.info(f'Продолжение незавершённого запуска: {run}')
+        run.status = 'S'
+        run.error = ''
+        run.save(update_fields=['status', 'error'])
+        return run
+
+    @staticmethod
+    def create_chunks(run: NewsletterRun, client_id_ranges: List[Tuple[Optional[int], Optional[int]]]) -> None:
+        NewsletterRunChunk.objects.bulk_create([
+            NewsletterRunChunk(run=run, first_client_id=first_client_id, last_client_id=last_client_id)
+            for first_client_id, last_client_id in client_id_ranges
+        ])
+
+    @staticmethod
+    def finish_run(run: NewsletterRun) -> Dict[str, int]:
+        """
+        Суммирует результаты отправки по всем частям запуска и завершает запуск.
+        Если какая-то часть не завершена, запуск помечается прерванным и может быть продолжен позже.
+        """
+        totals = run.chunks.aggregate(
+            sent=Coalesce(Sum('sent_count'), 0),
+            failed=Coalesce(Sum('failed_count'), 0),
+            duplicates=Coalesce(Sum('duplicates_skipped'), 0)
+        )
+        unfinished_chunk = run.chunks.exclude(status='F').first()
+        totals['error'] = (unfinished_chunk.error or 'Часть запуска не завершена') if unfinished_chunk else ''
 
-    def save_newsletter_log(self, status: str, service_response: str, message: Message, client: Client) -> None:
+        run.sent_count = totals['sent']
+        run.failed_count = totals['failed']
+        run.duplicates_skipped = totals['duplicates']
+        run.status = 'A' if unfinished_chunk else 'F'
+        run.error = totals['error']
+        run.finished_at = timezone.now()
+        run.save()
+        logger.info(
+            f'{run} {run.get_status_display().lower()}: отправлено {run.sent_count}, ошибок {run.failed_count}, '
+            f'пропущено повторяющихся адресов {run.duplicates_skipped}'
+        )
+        return totals
+
+    @staticmethod
+    def get_resume_delay(run: NewsletterRun) -> Optional[int]:
+        """
+        Возвращает, через сколько секунд продолжить прерванный запуск.
+        Задержка равна времени, прошедшему с начала запуска, но не меньше NEWSLETTER_RUN_RESUME_DELAY,
+        поэтому при повторных прерываниях она растёт примерно вдвое. Продолжение назначается не позже,
+        чем за NEWSLETTER_RUN_RESUME_DELAY до конца окна NEWSLETTER_RUN_RESUME_WINDOW: иначе следующий
+        запуск начался бы заново. Если времени не осталось, возвращает None.
+        """
+        elapsed = (timezone.now() - run.started_at).total_seconds()
+        remaining = settings.NEWSLETTER_RUN_RESUME_WINDOW - settings.NEWSLETTER_RUN_RESUME_DELAY - elapsed
+        if remaining <= 0:
+            return None
+        return int(min(max(elapsed, settings.NEWSLETTER_RUN_RESUME_DELAY), remaining))
+
+    @staticmethod
+    def empty_totals() -> Dict[str, int]:
+        return {'sent': 0, 'failed': 0, 'duplicates': 0, 'error': ''}
+
+    @staticmethod
+    def prepare_email(compiled_message: CompiledMessage) -> Optional[PreparedEmail]:
+        """
+        Собирает MIME-структуру письма один раз на запуск, если сообщение одинаково для всех клиентов.
+        """
+        if compiled_message.is_personalized:
+            return None
+        return PreparedEmail(
+            subject=compiled_message.subject,
+            body=compiled_message.body,
+            from_email=settings.EMAIL_HOST_USER
+        )
+
+    @staticmethod
+    def build_email(compiled_message: CompiledMessage, prepared_email: Optional[PreparedEmail],
+                    client: Client) -> EmailMessage:
+        if prepared_email is not None:
+            return prepared_email.for_recipient(client.email)
+
+        subject, body = compiled_message.render(client=client)
+        return EmailMessage(
+            subject=subject,
+            body=body,
+            from_email=settings.EMAIL_HOST_USER,
+            to=[client.email]
+        )
+
+    def save_newsletter_log(self, status: str, service_response: str, message: Optional[Message],
+                            client: Optional[Client]) -> None:
+        """
+        Добавляет лог отправки в буфер, который записывается в базу пачками.
+        """
         newsletter_log = NewsletterLog(
             status=status,
-            server_response=service_response,
+            response_id=ServerResponseCache.get_id(service_response),
             message=message,
             client=client,
-            newsletter=self.newsletter
+            newsletter=self.newsletter,
+            owner_id=self.newsletter.created_by_id
         )
-        newsletter_log.save()
+        self.log_buffer.add(newsletter_log)
 
-    def create_schedule(self) -> CrontabSchedule:
+    def get_schedule_args(self) -> Dict[str, Any]:
+        """
+        Возвращает поля расписания CrontabSchedule, соответствующие времени и периодичности рассылки.
+        День недели и месяца выбирается так же, как в calculate_next_run_at, по get_local_created_at.
+        При включённом сглаживании время сдвигается на целое число минут сдвига рассылки.
+        Чтобы не менять день недели и месяца, сдвиг не переходит через полночь: если окно длиннее
+        оставшихся до конца дня минут, сдвиг берётся по модулю их количества и распределяет
+        рассылки по концу дня, а не собирает их все в 23:59.
+        """
+        start_minutes = self.newsletter.time.hour * 60 + self.newsletter.time.minute
+        offset_minutes = int(self.get_schedule_offset().total_seconds() // 60) % (24 * 60 - start_minutes)
+        hour, minute = divmod(start_minutes + offset_minutes, 60)
         schedule_args = {
-            'minute': self.newsletter.time.minute,
-            'hour': self.newsletter.time.hour,
+            'minute': minute,
+            'hour': hour,
         }
 
         if self.newsletter.frequency == 'D':
@@ -81,64 +1021,459 @@ class NewsletterDeliveryService:
         elif self.newsletter.frequency == 'W':
             schedule_args.update(
                 {
-                    'day_of_week': self.newsletter.created_at.weekday(),
+                    # В cron дни недели считаются с воскресенья (0), в Python — с понедельника
+                    'day_of_week': (self.get_local_created_at().weekday() + 1) % 7,
                     'day_of_month': '*'
                 }
             )
 
         elif self.newsletter.frequency == 'M':
-            day_of_month = self.newsletter.created_at.day if self.newsletter.created_at.day <= 28 else 28
             schedule_args.update(
                 {
                     'day_of_week': '*',
-                    'day_of_month': day_of_month
+                    'day_of_month': min(self.get_local_created_at().day, 28)
                 }
             )
 
-        schedule, _ = CrontabSchedule.objects.get_or_create(**schedule_args, month_of_year='*')
+        schedule_args['month_of_year'] = '*'
+        return schedule_args
+
+    def create_schedule(self) -> CrontabSchedule:
+        schedule, _ = CrontabSchedule.objects.get_or_create(**self.get_schedule_args())
 
         return schedule
 
+    def calculate_next_run_at(self, after: datetime = None) -> datetime:
+        """
+        Вычисляет ближайшее после after время запуска рассылки по её периодичности.
+        Время рассылки задаётся в часовом поясе CELERY_TIMEZONE, как и в расписаниях Celery beat.
+        Еженедельная рассылка запускается в день недели её создания,
+        ежемесячная — в день месяца её создания, но не позже 28-го числа.
+        При включённом сглаживании к выбранному времени прибавляется сдвиг рассылки.
+        """
+        tz = ZoneInfo(settings.CELERY_TIMEZONE)
+        offset = self.get_schedule_offset()
+        after = (after or timezone.now()).astimezone(tz) - offset
+        created_at = self.get_local_created_at()
+
+        run_date = after.date()
+        while True:
+            run_at = datetime.combine(run_date, self.newsletter.time, tzinfo=tz)
+            if run_at > after and self.is_run_day(run_date=run_date, created_at=created_at):
+                return run_at + offset
+            run_date += timedelta(days=1)
+
+    def get_schedule_offset(self) -> timedelta:
+        """
+        Возвращает сдвиг запуска рассылки относительно выбранного пользователем времени.
+        Сдвиг определяется хешем id рассылки, поэтому не меняется между запусками и равномерно
+        распределяет рассылки с одинаковым временем по окну NEWSLETTER_SCHEDULE_SMOOTHING_WINDOW секунд.
+        Если окно не задано, сдвига нет.
+        """
+        window = settings.NEWSLETTER_SCHEDULE_SMOOTHING_WINDOW
+        if not window:
+            return timedelta(0)
+        digest = hashlib.blake2b(str(self.newsletter.pk).encode(), digest_size=8).digest()
+        return timedelta(seconds=int.from_bytes(digest, 'big') % window)
+
+    def get_local_created_at(self) -> datetime:
+        """
+        Возвращает время создания рассылки в часовом поясе CELERY_TIMEZONE.
+        По нему оба способа запуска выбирают день недели и месяца рассылки.
+        """
+        return self.newsletter.created_at.astimezone(ZoneInfo(settings.CELERY_TIMEZONE))
+
+    def is_run_day(self, run_date: date, created_at: datetime) -> bool:
+        if self.newsletter.frequency == 'W':
+            return run_date.weekday() == created_at.weekday()
+        if self.newsletter.frequency == 'M':
+            return run_date.day == min(created_at.day, 28)
+        return True
+
+    @staticmethod
+    def claim_due_newsletters(limit: int = None) -> List[int]:
+        """
+        Забирает рассылки, время запуска которых наступило, и переносит их next_run_at на следующий запуск.
+        Рассылки выбираются по частичному индексу next_run_at, поэтому стоимость выборки зависит
+        только от количества рассылок к запуску, а не от их общего количества.
+        Рассылки с истёкшим сроком не запускаются, их завершает finish_expired_newsletters.
+        Строки, заблокированные параллельным диспетчером, пропускаются.
+        Возвращает id забранных рассылок.
+        """
+        limit = limit or settings.NEWSLETTER_DISPATCH_BATCH_SIZE
+        now = timezone.now()
+        with transaction.atomic():
+            newsletters = list(
+                Newsletter.objects.select_for_update(skip_locked=True)
+                .filter(is_active=True, status='S', next_run_at__lte=now, finish_at__gt=now)
+                .order_by('next_run_at')
+                .only('id', 'time', 'frequency', 'created_at', 'next_run_at')[:limit]
+            )
+            for newsletter in newsletters:
+                delivery_service = NewsletterDeliveryService(newsletter=newsletter)
+                newsletter.next_run_at = delivery_service.calculate_next_run_at(after=now)
+            Newsletter.objects.bulk_update(newsletters, ['next_run_at'])
+        return [newsletter.pk for newsletter in newsletters]
+
     def create_task(self):
         """
-        Создаёт периодическую задачу для рассылки.
+        Ставит рассылку в расписание.
+        В режиме NEWSLETTER_SCHEDULER = 'dispatcher' задаёт время следующего запуска,
+        которое проверяет задача dispatch_due_newsletters, в режиме 'beat' создаёт периодическую задачу.
         """
+        if settings.NEWSLETTER_SCHEDULER == 'dispatcher':
+            self.newsletter.next_run_at = self.calculate_next_run_at()
+            self.newsletter.save(update_fields=['next_run_at'])
+            return
+
         schedule = self.create_schedule()
-        PeriodicTask.objects.create(
+        self.newsletter.periodic_task = PeriodicTask.objects.create(
             crontab=schedule,
             name=str(self.newsletter),
             task='app_newsletter.tasks.send_newsletter',
-            args=[self.newsletter.pk]
+            args=json.dumps([self.newsletter.pk])
         )
+        self.newsletter.save(update_fields=['periodic_task'])
 
     def delete_task(self):
         """
-        Удаляет периодическую задачу для рассылки.
+        Снимает рассылку с расписания: сбрасывает время следующего запуска
+        или, в режиме NEWSLETTER_SCHEDULER = 'beat', удаляет периодическую задачу.
         """
-        try:
-            task = PeriodicTask.objects.get(name=str(self.newsletter))
-            task.delete()
+        if settings.NEWSLETTER_SCHEDULER == 'dispatcher':
+            self.newsletter.next_run_at = None
             self.newsletter.status = 'F'
             self.newsletter.save()
-            logger.info('Задача удалена')
-        except PeriodicTask.DoesNotExist:
-            logger.exception(f'Периодической задачи для {self.newsletter} не существует.')
+            logger.info(f'{self.newsletter} снята с расписания')
+            return
 
-    def check_task_finish_datetime(self) -> bool:
-        end_datetime_str = f'{self.newsletter.finish_date} {self.newsletter.finish_time}'
-        end_datetime = datetime.strptime(end_datetime_str, "%Y-%m-%d %H:%M:%S")
-        end_datetime = timezone.make_aware(end_datetime, timezone=timezone.utc)
-        logger.info(f'Время завершения задачи: {end_datetime}')
+        if self.newsletter.periodic_task_id is None:
+            logger.error(f'Периодической задачи для {self.newsletter} не существует.')
+            return
 
-        current_time = datetime.now()
-        current_time = current_time.replace(tzinfo=timezone.utc)
-        logger.info(f'Текущее время: {current_time}')
+        PeriodicTask.objects.filter(pk=self.newsletter.periodic_task_id).delete()
+        self.newsletter.periodic_task = None
+        self.newsletter.status = 'F'
+        self.newsletter.save()
+        logger.info('Задача удалена')
 
-        if current_time > end_datetime:
-            logger.info('Время истекло. Задача должна быть удалена')
+    def check_task_finish_datetime(self) -> bool:
+        if self.newsletter.finish_at <= timezone.now():
+            logger.info(f'Время {self.newsletter} истекло в {self.newsletter.finish_at}. Задача должна быть удалена')
             return True
         return False
 
+    @staticmethod
+    def finish_expired_newsletters() -> int:
+        """
+        Завершает все запущенные рассылки, время завершения которых наступило:
+        одним запросом переводит их в статус 'F' и снимает с расписания,
+        и одним запросом удаляет их периодические задачи, если они есть.
+        Возвращает количество завершённых рассылок.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            expired_newsletters = list(
+                Newsletter.objects.select_for_update(skip_locked=True)
+                .filter(status='S', finish_at__lte=now)
+                .only('id', 'periodic_task_id')
+            )
+            if not expired_newsletters:
+                return 0
+            Newsletter.objects.filter(pk__in=[newsletter.pk for newsletter in expired_newsletters]).update(
+                status='F', next_run_at=None
+            )
+            periodic_task_ids = [newsletter.periodic_task_id for newsletter in expired_newsletters
+                                 if newsletter.periodic_task_id is not None]
+            if periodic_task_ids:
+                PeriodicTask.objects.filter(pk__in=periodic_task_ids).delete()
+                PeriodicTasks.update_changed()
+
+        logger.info(f'Завершено рассылок с истёкшим сроком: {len(expired_newsletters)}')
+        return len(expired_newsletters)
+
+
+class NewsletterScheduleReconciler:
+    """
+    Сверяет расписание рассылок с периодическими задачами django_celery_beat.
+
+    В режиме NEWSLETTER_SCHEDULER = 'beat' создаёт задачи для запущенных рассылок, у которых их нет,
+    исправляет устаревшие расписания и удаляет задачи отправки, не связанные с запущенной рассылкой.
+    В режиме 'dispatcher' удаляет все задачи отправки и выставляет или сбрасывает next_run_at.
+    Все изменения выполняются массовыми запросами, количество запросов не зависит от количества рассылок.
+    """
+
+    SEND_TASK = 'app_newsletter.tasks.send_newsletter'
+
+    def __init__(self, dry_run: bool = False) -> None:
+        self.dry_run = dry_run
+        self.now = timezone.now()
+        self.schedules = {}
+
+    def reconcile(self) -> Dict[str, int]:
+        """
+        Выполняет сверку в одной транзакции. При dry_run транзакция откатывается,
+        а возвращаются количества изменений, которые были бы сделаны.
+        """
+        with transaction.atomic():
+            totals = {'deleted': self.delete_orphan_tasks(), 'created': 0, 'updated': 0, 'scheduled': 0,
+                      'unscheduled': 0}
+            if settings.NEWSLETTER_SCHEDULER == 'beat':
+                totals.update(self.sync_periodic_tasks())
+            else:
+                totals.update(self.sync_next_run_at())
+            if self.dry_run:
+                transaction.set_rollback(True)
+            elif totals['deleted'] or totals['created'] or totals['updated']:
+                PeriodicTasks.update_changed()
+        return totals
+
+    def get_scheduled_newsletters(self) -> QuerySet[Newsletter]:
+        return Newsletter.objects.filter(is_active=True, status='S', finish_at__gt=self.now)
+
+    def delete_orphan_tasks(self) -> int:
+        """
+        Удаляет задачи отправки, которые не связаны ни с одной запущенной рассылкой.
+        """
+        orphan_tasks = PeriodicTask.objects.filter(task=self.SEND_TASK)
+        if settings.NEWSLETTER_SCHEDULER == 'beat':
+            orphan_tasks = orphan_tasks.exclude(
+                pk__in=self.get_scheduled_newsletters().filter(periodic_task__isnull=False).values('periodic_task_id')
+            )
+        _, deleted = orphan_tasks.delete()
+        return deleted.get(PeriodicTask._meta.label, 0)
+
+    def sync_periodic_tasks(self) -> Dict[str, int]:
+        """
+        Создаёт недостающие задачи отправки и исправляет расписания, не совпадающие с настройками рассылок.
+        """
+        newsletters = list(self.get_scheduled_newsletters().select_related('periodic_task__crontab'))
+        missing_newsletters = []
+        stale_tasks = []
+        for newsletter in newsletters:
+            schedule_args = NewsletterDeliveryService(newsletter=newsletter).get_schedule_args()
+            task = newsletter.periodic_task
+            if task is None:
+                missing_newsletters.append((newsletter, schedule_args))
+            elif task.crontab is None or any(str(getattr(task.crontab, field)) != str(value)
+                                             for field, value in schedule_args.items()):
+                task.crontab = self.get_schedule(schedule_args)
+                stale_tasks.append(task)
+
+        PeriodicTask.objects.bulk_update(stale_tasks, ['crontab'], batch_size=500)
+
+        new_tasks = PeriodicTask.objects.bulk_create(
+            [
+                PeriodicTask(
+                    crontab=self.get_schedule(schedule_args),
+                    name=str(newsletter),
+                    task=self.SEND_TASK,
+                    args=json.dumps([newsletter.pk])
+                )
+                for newsletter, schedule_args in missing_newsletters
+            ],
+            batch_size=500
+        )
+        for (newsletter, _), task in zip(missing_newsletters, new_tasks):
+            newsletter.periodic_task = task
+        Newsletter.objects.bulk_update([newsletter for newsletter, _ in missing_newsletters], ['periodic_task'],
+                                       batch_size=500)
+
+        return {'created': len(new_tasks), 'updated': len(stale_tasks)}
+
+    def sync_next_run_at(self) -> Dict[str, int]:
+        """
+        Выставляет next_run_at запущенным рассылкам без него и сбрасывает у остальных.
+        """
+        newsletters = list(
+            self.get_scheduled_newsletters()
+            .filter(next_run_at__isnull=True)
+            .only('id', 'time', 'frequency', 'created_at')
+        )
+        for newsletter in newsletters:
+            newsletter.next_run_at = NewsletterDeliveryService(newsletter=newsletter).calculate_next_run_at()
+        Newsletter.objects.bulk_update(newsletters, ['next_run_at'], batch_size=500)
+
+        unscheduled = Newsletter.objects.filter(next_run_at__isnull=False).filter(
+            Q(is_active=False) | ~Q(status='S') | Q(finish_at__lte=self.now)
+        ).update(next_run_at=None)
+
+        return {'scheduled': len(newsletters), 'unscheduled': unscheduled}
+
+    def get_schedule(self, schedule_args: Dict[str, Any]) -> CrontabSchedule:
+        """
+        Возвращает расписание с заданными полями, создавая его при необходимости.
+        Одинаковые расписания запрашиваются из базы один раз за сверку.
+        """
+        key = tuple(sorted((field, str(value)) for field, value in schedule_args.items()))
+        if key not in self.schedules:
+            self.schedules[key], _ = CrontabSchedule.objects.get_or_create(**schedule_args)
+        return self.schedules[key]
+
+
+class NewsletterLogArchiveService:
+    """
+    Переносит старые логи отправки в сжатые файлы архива и удаляет их из таблицы newsletter_logs.
+
+    Логи выбираются пачками по id и каждая пачка сначала дописывается в архив, а затем удаляется
+    отдельной короткой транзакцией, поэтому таблица не блокируется надолго.
+    Если команду прервать, уже удалённые логи остаются в архиве, а при повторном запуске
+    последняя пачка может попасть в архив второй раз.
+    """
+
+    FIELDS = ['id', 'date_time', 'status', 'server_response', 'client_id', 'message_id', 'newsletter_id', 'owner_id']
+
+    def __init__(self, cutoff: datetime, batch_size: int = None) -> None:
+        self.cutoff = cutoff
+        self.batch_size = batch_size or settings.NEWSLETTER_LOG_ARCHIVE_BATCH_SIZE
+
+    def iter_batches(self) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Выбирает логи старше cutoff пачками в порядке возрастания id.
+        """
+        logs = (
+            NewsletterLog.objects.filter(date_time__lt=self.cutoff)
+            .annotate(server_response=F('response__text'))
+            .order_by('pk')
+            .values(*self.FIELDS)
+        )
+        batch = list(logs[:self.batch_size])
+        while batch:
+            yield batch
+            batch = list(logs.filter(pk__gt=batch[-1]['id'])[:self.batch_size])
+
+    def archive(self, path: str, file_format: str, delete: bool = True) -> int:
+        """
+        Записывает логи старше cutoff в новый файл path (gzip, формат 'jsonl' или 'csv')
+        и, если delete, удаляет каждую записанную пачку из базы. Существующий файл не перезаписывается.
+        Возвращает количество логов.
+        """
+        archived = 0
+        with gzip.open(path, 'xt', encoding='utf-8', newline='') as archive_file:
+            writer = csv.DictWriter(archive_file, fieldnames=self.FIELDS) if file_format == 'csv' else None
+            if writer is not None:
+                writer.writeheader()
+            for batch in self.iter_batches():
+                for row in batch:
+                    row['date_time'] = row['date_time'].isoformat()
+                    if writer is not None:
+                        writer.writerow(row)
+                    else:
+                        archive_file.write(json.dumps(row, ensure_ascii=False) + '\n')
+                archive_file.flush()
+                if delete:
+                    NewsletterLog.objects.filter(pk__in=[row['id'] for row in batch]).delete()
+                archived += len(batch)
+                logger.info(f'В архив {path} перенесено логов: {archived}')
+        return archived
+
+    @staticmethod
+    def purge_newsletter_logs(newsletter_ids: List[int], batch_size: int = None) -> int:
+        """
+        Удаляет логи рассылок пачками перед удалением самих рассылок,
+        чтобы каскадное удаление не выполнялось одним огромным DELETE.
+        """
+        batch_size = batch_size or settings.NEWSLETTER_LOG_ARCHIVE_BATCH_SIZE
+        deleted = 0
+        while True:
+            log_ids = list(
+                NewsletterLog.objects.filter(newsletter_id__in=newsletter_ids).values_list('pk', flat=True)[:batch_size]
+            )
+            if not log_ids:
+                return deleted
+            deleted += NewsletterLog.objects.filter(pk__in=log_ids).delete()[0]
+
+
+class NewsletterLogExportService:
+    """
+    Выгружает логи отправки в CSV или JSONL построчно, от новых к старым.
+
+    Логи читаются серверным курсором (QuerySet.iterator) порциями по chunk_size строк,
+    а готовые строки отдаются такими же порциями, поэтому память не зависит от количества логов.
+    Фильтры по владельцу, рассылке, статусу и датам попадают в запрос и используют индексы newsletter_logs.
+    """
+
+    FIELDS = ['id', 'date_time', 'status', 'server_response', 'client_email', 'message_id', 'newsletter_id',
+              'owner_id']
+    FORMATS = ['csv', 'jsonl']
+
+    def __init__(self, owner_id: Optional[int] = None, newsletter_id: Optional[int] = None,
+                 status: Optional[str] = None, date_from: Optional[date] = None, date_to: Optional[date] = None,
+                 chunk_size: int = None) -> None:
+        self.owner_id = owner_id
+        self.newsletter_id = newsletter_id
+        self.status = status
+        self.date_from = date_from
+        self.date_to = date_to
+        self.chunk_size = chunk_size or settings.NEWSLETTER_LOG_EXPORT_CHUNK_SIZE
+
+    def get_queryset(self) -> QuerySet:
+        """
+        Возвращает логи, подходящие под фильтры, в виде словарей с полями FIELDS.
+        date_from и date_to включаются в выгрузку целиком, границы дней берутся в часовом поясе TIME_ZONE.
+        """
+        logs = NewsletterLog.objects.all()
+        if self.owner_id is not None:
+            logs = logs.filter(owner_id=self.owner_id)
+        if self.newsletter_id is not None:
+            logs = logs.filter(newsletter_id=self.newsletter_id)
+        if self.status:
+            logs = logs.filter(status=self.status)
+        if self.date_from is not None:
+            logs = logs.filter(date_time__gte=self.get_day_start(day=self.date_from))
+        if self.date_to is not None:
+            logs = logs.filter(date_time__lt=self.get_day_start(day=self.date_to + timedelta(days=1)))
+        return (
+            logs.annotate(server_response=F('response__text'), client_email=F('client__email'))
+            .order_by('-date_time', '-id')
+            .values(*self.FIELDS)
+        )
+
+    @staticmethod
+    def get_day_start(day: date) -> datetime:
+        return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+    def iter_rows(self) -> Iterator[Dict[str, Any]]:
+        for row in self.get_queryset().iterator(chunk_size=self.chunk_size):
+            row['date_time'] = row['date_time'].isoformat()
+            yield {field: row[field] for field in self.FIELDS}
+
+    def iter_lines(self, file_format: str) -> Iterator[str]:
+        """
+        Возвращает текст выгрузки в формате 'csv' или 'jsonl' порциями по chunk_size строк.
+        """
+        if file_format == 'csv':
+            buffer = EchoBuffer()
+            writer = csv.DictWriter(buffer, fieldnames=self.FIELDS)
+            header = writer.writeheader()
+            format_row = writer.writerow
+        else:
+            header = ''
+            format_row = self.format_jsonl_row
+
+        lines = [header] if header else []
+        for row in self.iter_rows():
+            lines.append(format_row(row))
+            if len(lines) >= self.chunk_size:
+                yield ''.join(lines)
+                lines = []
+        if lines:
+            yield ''.join(lines)
+
+    @staticmethod
+    def format_jsonl_row(row: Dict[str, Any]) -> str:
+        return json.dumps(row, ensure_ascii=False) + '\n'
+
+
+class EchoBuffer:
+    """
+    Файлоподобный объект для csv.writer, который возвращает записанную строку вместо её хранения.
+    """
+
+    @staticmethod
+    def write(value: str) -> str:
+        return value
+
 
 class ActiveNewsletterMixin:
     def get(self, request: HttpRequest, *args, **kwargs) -> HttpResponseRedirect:
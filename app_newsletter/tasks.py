@@ -1,13 +1,189 @@
-from celery import shared_task
+import logging
+from itertools import groupby
 
-from .models import Newsletter
+from celery import chord, shared_task
+from django.conf import settings
+
+from .coordination import NewsletterRunLock, OwnerConcurrencyLimiter, get_owner_queue
+from .models import Newsletter, NewsletterRun, NewsletterRunChunk
 from .services import NewsletterDeliveryService
 
+logger = logging.getLogger(__name__)
+
 
 @shared_task
-def send_newsletter(newsletter_id: int) -> None:
+def send_newsletter(newsletter_id: int, scheduler: str = 'beat') -> None:
+    """
+    Запускает рассылку: делит клиентов на диапазоны id и отправляет их параллельно
+    группой подзадач, после которых finish_newsletter_run подводит итоги запуска.
+    Незавершённый запуск продолжается: заново отправляются только его незавершённые части.
+
+    scheduler — кто поставил задачу: периодические задачи django_celery_beat передают только id рассылки,
+    dispatch_due_newsletters передаёт 'dispatcher'. Запуск от планировщика, не совпадающего
+    с NEWSLETTER_SCHEDULER (например, от оставшейся после перехода на 'dispatcher' задачи beat), пропускается,
+    чтобы рассылка не отправлялась дважды.
+
+    На время запуска берётся блокировка рассылки, её продлевают подзадачи и снимает finish_newsletter_run.
+    Если рассылка уже отправляется, повторный запуск присоединяется к текущему и ничего не отправляет.
+    Токен блокировки сохраняется в запуске как dispatch_token. Если части ждали в очереди дольше
+    NEWSLETTER_RUN_LOCK_TTL и запуск продолжен заново с другой блокировкой, прежние подзадачи
+    и прежний finish_newsletter_run видят чужой токен и ничего не делают, поэтому части не отправляются дважды.
+
+    Подзадачи отправляются в очередь владельца рассылки (см. get_owner_queue), чтобы большие рассылки
+    одного пользователя не задерживали рассылки остальных.
+    """
+    if scheduler != settings.NEWSLETTER_SCHEDULER:
+        logger.warning(f'Запуск рассылки #{newsletter_id} от планировщика {scheduler} пропущен: '
+                       f'рассылки запускает {settings.NEWSLETTER_SCHEDULER}')
+        return
 
     newsletter = Newsletter.objects.get(pk=newsletter_id)
     delivery_service = NewsletterDeliveryService(newsletter=newsletter)
-    delivery_service.send_mail_to_client()
-    
\ No newline at end of file
+
+    if delivery_service.check_task_finish_datetime():
+        delivery_service.delete_task()
+        return
+
+    run_lock = NewsletterRunLock(newsletter_id=newsletter_id)
+    if not run_lock.acquire():
+        logger.info(f'{newsletter} уже отправляется, запуск объединён с текущим')
+        return
+
+    try:
+        run = delivery_service.start_run()
+        if not run.chunks.exists():
+            delivery_service.create_chunks(run=run, client_id_ranges=delivery_service.get_client_id_ranges())
+
+        chunk_ids = list(run.chunks.exclude(status='F').values_list('pk', flat=True))
+        if not chunk_ids:
+            delivery_service.finish_run(run=run)
+            run_lock.release()
+            return
+
+        run.dispatch_token = run_lock.token
+        run.save(update_fields=['dispatch_token'])
+
+        queue = get_owner_queue(owner_id=newsletter.created_by_id)
+        chord(
+            send_newsletter_chunk.s(chunk_id, run_lock.token).set(queue=queue) for chunk_id in chunk_ids
+        )(finish_newsletter_run.si(run.pk, run_lock.token))
+    except Exception:
+        run_lock.release()
+        raise
+
+
+@shared_task(bind=True, acks_late=True, reject_on_worker_lost=True, max_retries=None)
+def send_newsletter_chunk(self, chunk_id: int, lock_token: str) -> dict:
+    """
+    Отправляет одну часть запуска рассылки.
+    Если у владельца рассылки уже отправляется NEWSLETTER_OWNER_CONCURRENCY частей,
+    задача откладывается на NEWSLETTER_OWNER_RETRY_DELAY секунд и освобождает воркер для других пользователей.
+    """
+    chunk = NewsletterRunChunk.objects.select_related('run__newsletter').get(pk=chunk_id)
+    if chunk.run.dispatch_token != lock_token:
+        logger.info(f'{chunk} уже отправлена повторно с другой блокировкой, подзадача пропущена')
+        return NewsletterDeliveryService.empty_totals()
+
+    run_lock = NewsletterRunLock(newsletter_id=chunk.run.newsletter_id, token=lock_token)
+    owner_slot = OwnerConcurrencyLimiter(owner_id=chunk.run.newsletter.created_by_id)
+
+    if not owner_slot.acquire():
+        run_lock.renew()
+        raise self.retry(countdown=settings.NEWSLETTER_OWNER_RETRY_DELAY)
+
+    try:
+        with owner_slot.heartbeat(), run_lock.heartbeat():
+            delivery_service = NewsletterDeliveryService(newsletter=chunk.run.newsletter)
+            return delivery_service.deliver(chunk=chunk)
+    finally:
+        owner_slot.release()
+
+
+@shared_task
+def finish_newsletter_run(run_id: int, lock_token: str) -> None:
+    """
+    Подводит итоги запуска после всех подзадач и снимает блокировку рассылки.
+    Если части запуска уже отправлены повторно с другой блокировкой, итоги подведёт новый вызов.
+    Прерванный запуск продолжается отложенной задачей send_newsletter (см. schedule_run_resume).
+    """
+    run = NewsletterRun.objects.select_related('newsletter').get(pk=run_id)
+    if run.dispatch_token != lock_token:
+        logger.info(f'{run} продолжен с другой блокировкой, итоги прежней отправки частей пропущены')
+        return
+
+    try:
+        NewsletterDeliveryService.finish_run(run=run)
+    finally:
+        NewsletterRunLock(newsletter_id=run.newsletter_id, token=lock_token).release()
+
+    if run.status == 'A':
+        schedule_run_resume(run=run)
+
+
+def schedule_run_resume(run: NewsletterRun) -> None:
+    """
+    Откладывает продолжение прерванного запуска, пока его ещё можно продолжить (см. get_resume_delay).
+    Без этого запуск продолжил бы только следующий плановый запуск рассылки, а он обычно наступает
+    позже NEWSLETTER_RUN_RESUME_WINDOW и начинает отправку заново, так что клиенты, до которых
+    не дошла прерванная отправка, не получили бы письма.
+    """
+    if not run.newsletter.is_active:
+        return
+    delay = NewsletterDeliveryService.get_resume_delay(run=run)
+    if delay is None:
+        logger.error(f'{run} прерван и не будет продолжен: окно продолжения NEWSLETTER_RUN_RESUME_WINDOW истекло')
+        return
+    logger.warning(f'{run} прерван: {run.error}. Продолжение через {delay} с')
+    send_newsletter.apply_async(args=[run.newsletter_id], kwargs={'scheduler': settings.NEWSLETTER_SCHEDULER},
+                                countdown=delay)
+
+
+@shared_task
+def retry_failed_deliveries() -> None:
+    """
+    Разбирает очередь повторов: повторно отправляет письма, время следующей попытки которых наступило.
+    Повторы отключённых и завершённых рассылок удаляются без отправки.
+    """
+    retries = NewsletterDeliveryService.claim_due_retries()
+
+    for newsletter, newsletter_retries in groupby(retries, key=lambda retry: retry.newsletter):
+        newsletter_retries = list(newsletter_retries)
+        if not newsletter.is_active or newsletter.status == 'F':
+            newsletter.retries.filter(pk__in=[retry.pk for retry in newsletter_retries]).delete()
+            continue
+        delivery_service = NewsletterDeliveryService(newsletter=newsletter)
+        delivery_service.retry_failed_deliveries(retries=newsletter_retries)
+
+
+@shared_task
+def dispatch_due_newsletters() -> int:
+    """
+    Ставит в очередь рассылки, время запуска которых наступило.
+    Выполняется Celery beat каждые NEWSLETTER_DISPATCH_INTERVAL секунд в режиме NEWSLETTER_SCHEDULER = 'dispatcher'
+    и забирает рассылки пачками, пока готовые к запуску не закончатся.
+    Возвращает количество поставленных в очередь рассылок.
+    """
+    if settings.NEWSLETTER_SCHEDULER != 'dispatcher':
+        return 0
+
+    dispatched = 0
+    while True:
+        newsletter_ids = NewsletterDeliveryService.claim_due_newsletters()
+        for newsletter_id in newsletter_ids:
+            send_newsletter.delay(newsletter_id, scheduler='dispatcher')
+        dispatched += len(newsletter_ids)
+        if len(newsletter_ids) < settings.NEWSLETTER_DISPATCH_BATCH_SIZE:
+            break
+
+    if dispatched:
+        logger.info(f'Запущено рассылок: {dispatched}')
+    return dispatched
+
+
+@shared_task
+def finish_expired_newsletters() -> int:
+    """
+    Завершает рассылки с истёкшим сроком. Выполняется Celery beat каждые NEWSLETTER_EXPIRY_SWEEP_INTERVAL секунд,
+    чтобы истёкшие рассылки сразу переставали занимать расписание и воркеры.
+    """
+    return NewsletterDeliveryService.finish_expired_newsletters()
@@ -1,3 +1,504 @@
-from django.test import TestCase
+import smtplib
+from collections import Counter
+from datetime import date, datetime, time, timedelta, timezone
+from email import message_from_bytes
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core import mail
+from django.core.management import call_command
+from django.core.mail.backends.locmem import EmailBackend
+from django.http import Http404
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone as django_timezone
+
+from app_client.models import Client
+from app_message.models import Message
+from app_user.models import CustomUser
+from pagination.keyset import InvalidCursor, KeysetPaginator
+from .models import (Newsletter, NewsletterDeliveryStats, NewsletterLog, NewsletterRetry, NewsletterRun,
+                     NewsletterRunChunk, ServerResponse)
+from .services import (CircuitOpenError, ConcurrentDeliveryEngine, DeliveryStatsService, NewsletterDeliveryService,
+                       PreparedEmail)
+from .tasks import finish_newsletter_run, send_newsletter, send_newsletter_chunk
+from .views import NewsletterLogListView
+
+
+class KeysetPaginatorTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        NewsletterLog.objects.bulk_create(NewsletterLog(status='S') for _ in range(12))
+        # Пары логов с одинаковым временем проверяют порядок по id, микросекунды — точность курсора
+        started_at = datetime(2026, 1, 1, 12, 0, 0, 123456, tzinfo=timezone.utc)
+        for index, log in enumerate(NewsletterLog.objects.order_by('pk')):
+            log.date_time = started_at + timedelta(microseconds=index // 2)
+            log.save(update_fields=['date_time'])
+        cls.expected = list(NewsletterLog.objects.order_by('-date_time', '-pk').values_list('pk', flat=True))
+
+    def get_paginator(self) -> KeysetPaginator:
+        return KeysetPaginator(object_list=NewsletterLog.objects.all(), per_page=5, ordering='-date_time')
+
+    def test_forward_pages_cover_list_once(self):
+        paginator = self.get_paginator()
+        page = paginator.page(None)
+        self.assertFalse(page.has_previous())
+
+        seen = [log.pk for log in page]
+        while page.has_next():
+            page = paginator.page(page.next_page_number())
+            seen += [log.pk for log in page]
+
+        self.assertEqual(seen, self.expected)
+        self.assertEqual(len(page), 2)
+
+    def test_backward_pages_return_previous_pages(self):
+        paginator = self.get_paginator()
+        pages = [paginator.page(None)]
+        while pages[-1].has_next():
+            pages.append(paginator.page(pages[-1].next_page_number()))
+
+        page = pages[-1]
+        for expected_page in reversed(pages[:-1]):
+            page = paginator.page(page.previous_page_number())
+            self.assertEqual([log.pk for log in page], [log.pk for log in expected_page])
+            self.assertTrue(page.has_next())
+        self.assertFalse(page.has_previous())
+
+    def test_cursor_round_trip(self):
+        paginator = self.get_paginator()
+        log = NewsletterLog.objects.get(pk=self.expected[3])
+
+        backwards, value, pk = paginator.decode_cursor(paginator.encode_cursor(backwards=True, obj=log))
+
+        self.assertTrue(backwards)
+        self.assertEqual(value, log.date_time)
+        self.assertEqual(pk, log.pk)
+
+    def test_invalid_cursor(self):
+        paginator = self.get_paginator()
+        for cursor in ['1', 'not-a-cursor', 'WyJhIl0']:
+            with self.subTest(cursor=cursor), self.assertRaises(InvalidCursor):
+                paginator.page(cursor)
+
+    def test_view_answers_404_to_invalid_cursor(self):
+        user = CustomUser.objects.create(email='staff@test.ru', is_staff=True)
+        request = RequestFactory().get('/newsletter/newsletterlogs/', {'page': 'not-a-cursor'})
+        request.user = user
+
+        with self.assertRaises(Http404):
+            NewsletterLogListView.as_view()(request)
+
+
+class UnavailableAfterEmailBackend(EmailBackend):
+    """
+    Почтовый бэкенд, который отправляет sent_limit писем, а затем не может подключиться к серверу.
+    """
+
+    sent_limit = None
+
+    def send_messages(self, messages):
+        if self.sent_limit is not None and len(mail.outbox) >= self.sent_limit:
+            raise ConnectionRefusedError(111, 'Connection refused')
+        return super().send_messages(messages)
+
+
+class RefusingEmailBackend(EmailBackend):
+    """
+    Почтовый бэкенд, сервер которого отклоняет каждого получателя с адресом в тексте ответа.
+    """
+
+    def send_messages(self, messages):
+        recipients = {email: (550, f'5.1.1 <{email}>: Recipient address rejected'.encode())
+                      for message in messages for email in message.recipients()}
+        raise smtplib.SMTPRecipientsRefused(recipients)
+
+
+class DeliveryTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create(email='owner@test.ru')
+        cls.clients = [
+            Client.objects.create(email=email, first_name='Имя', last_name='Фамилия', created_by=cls.user)
+            for email in ['first@test.ru', 'second@test.ru', ' FIRST@test.ru ', 'third@test.ru']
+        ]
+        message = Message.objects.create(subject='Тема', body='Текст', created_by=cls.user)
+        cls.newsletter = Newsletter.objects.create(time=time(9, 0), frequency='D', status='S',
+                                                   finish_date=date(2099, 1, 1), finish_time=time(0, 0),
+                                                   created_by=cls.user)
+        cls.newsletter.clients.set(cls.clients)
+        cls.newsletter.messages.set([message])
+        cls.message = message
+
+    def deliver(self, chunk: NewsletterRunChunk) -> dict:
+        return NewsletterDeliveryService(newsletter=self.newsletter).deliver(chunk=chunk)
+
+
+@override_settings(NEWSLETTER_SMTP_RATE_LIMIT=None, NEWSLETTER_DELIVERY_CONCURRENCY=1)
+class DeliveryDeduplicationTest(DeliveryTestCase):
+    def test_duplicate_in_another_chunk_is_skipped(self):
+        run = NewsletterRun.objects.create(newsletter=self.newsletter)
+        NewsletterDeliveryService.create_chunks(run=run, client_id_ranges=[
+            (self.clients[0].pk, self.clients[1].pk), (self.clients[2].pk, self.clients[3].pk)
+        ])
+
+        totals = [self.deliver(chunk=chunk) for chunk in run.chunks.order_by('pk')]
+
+        self.assertEqual(sorted(email.to[0] for email in mail.outbox),
+                         ['first@test.ru', 'second@test.ru', 'third@test.ru'])
+        self.assertEqual([chunk_totals['duplicates'] for chunk_totals in totals], [0, 1])
+
+    def test_duplicate_is_skipped_after_resume(self):
+        run = NewsletterRun.objects.create(newsletter=self.newsletter)
+        chunk = NewsletterRunChunk.objects.create(run=run, checkpoint={str(self.message.pk): self.clients[1].pk})
+
+        totals = self.deliver(chunk=chunk)
+
+        self.assertEqual([email.to[0] for email in mail.outbox], ['third@test.ru'])
+        self.assertEqual(totals['duplicates'], 1)
+
+
+@override_settings(NEWSLETTER_SMTP_RATE_LIMIT=None, NEWSLETTER_DELIVERY_CONCURRENCY=1,
+                   NEWSLETTER_CIRCUIT_BREAKER_THRESHOLD=1, NEWSLETTER_SMTP_RECONNECT_ATTEMPTS=0,
+                   EMAIL_BACKEND='app_newsletter.tests.UnavailableAfterEmailBackend')
+class DeliveryAbortTest(DeliveryTestCase):
+
+    def tearDown(self):
+        UnavailableAfterEmailBackend.sent_limit = None
+
+    def test_resume_after_abort_does_not_resend(self):
+        run = NewsletterRun.objects.create(newsletter=self.newsletter)
+        chunk = NewsletterRunChunk.objects.create(run=run)
+        UnavailableAfterEmailBackend.sent_limit = 1
+
+        totals = self.deliver(chunk=chunk)
+
+        chunk.refresh_from_db()
+        self.assertEqual(chunk.status, 'A')
+        self.assertEqual((totals['sent'], totals['failed']), (1, 1))
+        self.assertEqual(chunk.checkpoint, {str(self.message.pk): self.clients[3].pk})
+        self.assertEqual(list(NewsletterRetry.objects.order_by('client_id').values_list('client_id', flat=True)),
+                         [self.clients[1].pk, self.clients[3].pk])
+        self.assertTrue(NewsletterLog.objects.filter(status='F', client__isnull=True).exists())
+        self.assertEqual(DeliveryStatsService.get_newsletter_totals(self.newsletter), {'sent': 1, 'failed': 1})
+        DeliveryStatsService.rebuild(newsletter_ids=[self.newsletter.pk])
+        self.assertEqual(DeliveryStatsService.get_newsletter_totals(self.newsletter), {'sent': 1, 'failed': 1})
+
+        UnavailableAfterEmailBackend.sent_limit = None
+        self.deliver(chunk=chunk)
+
+        self.assertEqual([email.to[0] for email in mail.outbox], ['first@test.ru'])
+
+    @override_settings(NEWSLETTER_DELIVERY_CONCURRENCY=2)
+    def test_email_skipped_before_a_sent_one_is_retried_not_resent(self):
+        # Поток со следующим письмом прошёл проверку предохранителя раньше потока с предыдущим
+        def send_many(engine, emails):
+            engine.circuit_breaker.is_open = True
+            return [None, CircuitOpenError(), None]
+
+        run = NewsletterRun.objects.create(newsletter=self.newsletter)
+        chunk = NewsletterRunChunk.objects.create(run=run)
+        with mock.patch.object(ConcurrentDeliveryEngine, 'send_many', autospec=True, side_effect=send_many):
+            totals = self.deliver(chunk=chunk)
+
+        chunk.refresh_from_db()
+        self.assertEqual((chunk.status, totals['sent']), ('A', 2))
+        self.assertEqual(chunk.checkpoint, {str(self.message.pk): self.clients[3].pk})
+        self.assertEqual(list(NewsletterRetry.objects.values_list('client_id', flat=True)), [self.clients[1].pk])
+
+        self.deliver(chunk=chunk)
+
+        self.assertEqual(mail.outbox, [])
+
+
+class DeliveryStatsRebuildTest(DeliveryTestCase):
+
+    def create_logs(self, day: date, count: int) -> None:
+        logs = NewsletterLog.objects.bulk_create(
+            NewsletterLog(status='S', newsletter=self.newsletter, owner=self.user, message=self.message,
+                          client=self.clients[0])
+            for _ in range(count)
+        )
+        NewsletterLog.objects.filter(pk__in=[log.pk for log in logs]).update(
+            date_time=datetime.combine(day, time(12, 0), tzinfo=timezone.utc)
+        )
+
+    def get_counts(self) -> dict:
+        return dict(NewsletterDeliveryStats.objects.filter(newsletter=self.newsletter).values_list('day', 'count'))
+
+    def test_partly_archived_first_day_keeps_its_counter(self):
+        first_day, second_day = date(2026, 3, 1), date(2026, 3, 2)
+        for day, count in [(first_day, 5), (second_day, 2)]:
+            NewsletterDeliveryStats.objects.create(newsletter=self.newsletter, owner=self.user, day=day, status='S',
+                                                   count=count)
+        # Четыре лога первого дня уже перенесены в архив
+        self.create_logs(day=first_day, count=1)
+        self.create_logs(day=second_day, count=3)
+
+        DeliveryStatsService.rebuild(newsletter_ids=[self.newsletter.pk])
+
+        self.assertEqual(self.get_counts(), {first_day: 5, second_day: 3})
+
+    def test_missing_counters_are_created_from_logs(self):
+        first_day, second_day = date(2026, 3, 1), date(2026, 3, 2)
+        self.create_logs(day=first_day, count=2)
+        self.create_logs(day=second_day, count=3)
+
+        created = DeliveryStatsService.rebuild(newsletter_ids=[self.newsletter.pk])
+
+        self.assertEqual(created, 2)
+        self.assertEqual(self.get_counts(), {first_day: 2, second_day: 3})
+
+
+class TransientErrorTest(SimpleTestCase):
+
+    def test_transient_and_permanent_errors(self):
+        cases = [
+            (smtplib.SMTPRecipientsRefused({'a@test.ru': (450, b'Mailbox busy')}), True),
+            (smtplib.SMTPRecipientsRefused({'a@test.ru': (450, b'Mailbox busy'), 'b@test.ru': (550, b'No such user')}),
+             False),
+            (smtplib.SMTPRecipientsRefused({'a@test.ru': (550, b'No such user')}), False),
+            (smtplib.SMTPDataError(421, 'Try again later'), True),
+            (smtplib.SMTPDataError(554, 'Transaction failed'), False),
+            (smtplib.SMTPSenderRefused(553, b'Sender rejected', 'from@test.ru'), False),
+            (smtplib.SMTPServerDisconnected('Connection unexpectedly closed'), True),
+            (ConnectionRefusedError(111, 'Connection refused'), True),
+            (TimeoutError('timed out'), True),
+            (smtplib.SMTPNotSupportedError('SMTPUTF8 not supported'), False),
+            (ValueError('Invalid address'), False),
+        ]
+        for error, is_transient in cases:
+            with self.subTest(error=error):
+                self.assertEqual(NewsletterDeliveryService.is_transient_error(error), is_transient)
+
+    @override_settings(NEWSLETTER_RETRY_BASE_DELAY=60, NEWSLETTER_RETRY_MAX_DELAY=600)
+    def test_retry_delay_doubles_up_to_max(self):
+        self.assertEqual([NewsletterDeliveryService.get_retry_delay(attempts=attempts) for attempts in range(1, 7)],
+                         [60, 120, 240, 480, 600, 600])
+
+
+@override_settings(NEWSLETTER_RETRY_LEASE=10 * 60, NEWSLETTER_RETRY_BATCH_SIZE=2)
+class ClaimDueRetriesTest(DeliveryTestCase):
+
+    def create_retry(self, client: Client, next_attempt_at: datetime) -> NewsletterRetry:
+        return NewsletterRetry.objects.create(newsletter=self.newsletter, message=self.message, client=client,
+                                              next_attempt_at=next_attempt_at, last_error='Connection refused')
+
+    def test_only_due_retries_are_claimed_and_leased(self):
+        now = django_timezone.now()
+        due = [self.create_retry(client=self.clients[index], next_attempt_at=now - timedelta(minutes=3 - index))
+               for index in range(3)]
+        future = self.create_retry(client=self.clients[3], next_attempt_at=now + timedelta(minutes=1))
+
+        with mock.patch('django.utils.timezone.now', return_value=now):
+            claimed = NewsletterDeliveryService.claim_due_retries()
+            claimed_again = NewsletterDeliveryService.claim_due_retries()
+
+        self.assertEqual([retry.pk for retry in claimed], [due[0].pk, due[1].pk])
+        self.assertEqual({retry.next_attempt_at for retry in claimed}, {now + timedelta(minutes=10)})
+        self.assertEqual([retry.pk for retry in claimed_again], [due[2].pk])
+        future.refresh_from_db()
+        self.assertEqual(future.next_attempt_at, now + timedelta(minutes=1))
+
+
+@override_settings(NEWSLETTER_SMTP_RATE_LIMIT=None, NEWSLETTER_DELIVERY_CONCURRENCY=1,
+                   NEWSLETTER_SMTP_RECONNECT_ATTEMPTS=0, NEWSLETTER_CIRCUIT_BREAKER_THRESHOLD=10,
+                   NEWSLETTER_RETRY_BASE_DELAY=60, NEWSLETTER_RETRY_MAX_DELAY=60 * 60, NEWSLETTER_RETRY_MAX_ATTEMPTS=3,
+                   EMAIL_BACKEND='app_newsletter.tests.UnavailableAfterEmailBackend')
+class RetryFailedDeliveriesTest(DeliveryTestCase):
+
+    def tearDown(self):
+        UnavailableAfterEmailBackend.sent_limit = None
+
+    def retry(self, attempts: int) -> NewsletterRetry:
+        retry = NewsletterRetry.objects.create(newsletter=self.newsletter, message=self.message,
+                                               client=self.clients[1], attempts=attempts,
+                                               next_attempt_at=django_timezone.now(), last_error='Connection refused')
+        NewsletterDeliveryService(newsletter=self.newsletter).retry_failed_deliveries(
+            retries=list(NewsletterRetry.objects.select_related('message', 'client'))
+        )
+        return retry
+
+    def test_sent_retry_is_removed(self):
+        retry = self.retry(attempts=1)
+
+        self.assertEqual([email.to[0] for email in mail.outbox], ['second@test.ru'])
+        self.assertFalse(NewsletterRetry.objects.filter(pk=retry.pk).exists())
+        self.assertTrue(NewsletterLog.objects.filter(status='S', client=self.clients[1]).exists())
+
+    def test_transient_error_postpones_retry_with_backoff(self):
+        UnavailableAfterEmailBackend.sent_limit = 0
+        now = django_timezone.now()
+
+        with mock.patch('django.utils.timezone.now', return_value=now):
+            retry = self.retry(attempts=1)
+
+        retry.refresh_from_db()
+        self.assertEqual(retry.attempts, 2)
+        self.assertEqual(retry.next_attempt_at, now + timedelta(seconds=120))
+        self.assertIn('Connection refused', retry.last_error)
+
+    def test_retry_is_dropped_after_max_attempts(self):
+        UnavailableAfterEmailBackend.sent_limit = 0
+
+        retry = self.retry(attempts=2)
+
+        self.assertFalse(NewsletterRetry.objects.filter(pk=retry.pk).exists())
+        self.assertTrue(NewsletterLog.objects.filter(status='F', client=self.clients[1]).exists())
+
+
+@override_settings(NEWSLETTER_SMTP_RATE_LIMIT=None, NEWSLETTER_DELIVERY_CONCURRENCY=1,
+                   EMAIL_BACKEND='app_newsletter.tests.RefusingEmailBackend')
+class DeliveryServerResponseTest(DeliveryTestCase):
+
+    def test_refusals_of_different_recipients_share_server_response(self):
+        run = NewsletterRun.objects.create(newsletter=self.newsletter)
+        chunk = NewsletterRunChunk.objects.create(run=run)
+
+        totals = self.deliver(chunk=chunk)
+
+        self.assertEqual(totals['failed'], 3)
+        self.assertEqual(list(ServerResponse.objects.values_list('text', flat=True)),
+                         ['550 5.1.1 <***>: Recipient address rejected'])
+
+
+class PreparedEmailTest(TestCase):
+
+    def test_date_header_is_set_per_recipient(self):
+        prepared_email = PreparedEmail(subject='Тема', body='Текст', from_email='from@test.ru')
+
+        with mock.patch('app_newsletter.services.formatdate', return_value='Mon, 02 Mar 2026 10:00:00 -0000'):
+            message = message_from_bytes(prepared_email.for_recipient('to@test.ru').message().as_bytes())
+
+        self.assertEqual(message.get_all('Date'), ['Mon, 02 Mar 2026 10:00:00 -0000'])
+        self.assertEqual(message['To'], 'to@test.ru')
+
+
+@override_settings(NEWSLETTER_SCHEDULE_SMOOTHING_WINDOW=60 * 60)
+class ScheduleSmoothingTest(TestCase):
+
+    def test_offset_near_midnight_is_spread_within_the_day(self):
+        newsletters = [Newsletter(pk=pk, time=time(23, 50), frequency='D') for pk in range(1, 101)]
+
+        schedules = [NewsletterDeliveryService(newsletter=newsletter).get_schedule_args()
+                     for newsletter in newsletters]
+
+        self.assertEqual({schedule['hour'] for schedule in schedules}, {23})
+        minutes = Counter(schedule['minute'] for schedule in schedules)
+        self.assertEqual(set(minutes), set(range(50, 60)))
+        self.assertLess(max(minutes.values()), 25)
+
+
+class ScheduleRunDayTest(TestCase):
+
+    def test_beat_and_dispatcher_choose_the_same_day(self):
+        # 22:30 UTC — уже следующий день в часовом поясе CELERY_TIMEZONE
+        for days in range(7):
+            created_at = datetime(2026, 3, 1, 22, 30, tzinfo=timezone.utc) + timedelta(days=days)
+            for frequency in ['W', 'M']:
+                with self.subTest(created_at=created_at, frequency=frequency):
+                    newsletter = Newsletter(pk=1, time=time(9, 0), frequency=frequency, created_at=created_at)
+                    service = NewsletterDeliveryService(newsletter=newsletter)
+                    local_created_at = service.get_local_created_at()
+
+                    schedule = service.get_schedule_args()
+                    next_run_at = service.calculate_next_run_at(after=created_at).astimezone(local_created_at.tzinfo)
+
+                    if frequency == 'W':
+                        self.assertEqual(next_run_at.weekday(), local_created_at.weekday())
+                        self.assertEqual(schedule['day_of_week'], (next_run_at.weekday() + 1) % 7)
+                    else:
+                        self.assertEqual(next_run_at.day, local_created_at.day)
+                        self.assertEqual(schedule['day_of_month'], next_run_at.day)
+
+
+@override_settings(NEWSLETTER_SCHEDULER='dispatcher')
+class SendNewsletterSchedulerTest(DeliveryTestCase):
+
+    def test_beat_call_is_skipped_in_dispatcher_mode(self):
+        send_newsletter(self.newsletter.pk)
+
+        self.assertFalse(self.newsletter.runs.exists())
+        self.assertEqual(mail.outbox, [])
+
+
+@override_settings(NEWSLETTER_RUN_RESUME_WINDOW=12 * 60 * 60, NEWSLETTER_RUN_RESUME_DELAY=5 * 60)
+@mock.patch('app_newsletter.tasks.NewsletterRunLock')
+@mock.patch('app_newsletter.tasks.send_newsletter.apply_async')
+class RunResumeTest(DeliveryTestCase):
+
+    def create_aborted_run(self, started_ago: timedelta) -> NewsletterRun:
+        run = NewsletterRun.objects.create(newsletter=self.newsletter, dispatch_token='token')
+        NewsletterRun.objects.filter(pk=run.pk).update(started_at=django_timezone.now() - started_ago)
+        NewsletterRunChunk.objects.create(run=run, status='A', error='Почтовый сервер недоступен')
+        run.refresh_from_db()
+        return run
+
+    def test_aborted_run_is_resumed_later(self, apply_async, run_lock):
+        run = self.create_aborted_run(started_ago=timedelta(minutes=1))
+
+        finish_newsletter_run.apply(args=[run.pk, 'token'])
+
+        run.refresh_from_db()
+        self.assertEqual(run.status, 'A')
+        apply_async.assert_called_once_with(args=[self.newsletter.pk], kwargs={'scheduler': 'dispatcher'},
+                                            countdown=5 * 60)
+
+    def test_resume_delay_grows_and_stays_within_window(self, apply_async, run_lock):
+        for started_ago, delay in [(timedelta(hours=2), 2 * 60 * 60), (timedelta(hours=11), 55 * 60),
+                                   (timedelta(hours=11, minutes=56), None)]:
+            with self.subTest(started_ago=started_ago):
+                run = self.create_aborted_run(started_ago=started_ago)
+                with mock.patch('django.utils.timezone.now', return_value=run.started_at + started_ago):
+                    self.assertEqual(NewsletterDeliveryService.get_resume_delay(run=run), delay)
+
+    def test_finished_run_is_not_resumed(self, apply_async, run_lock):
+        run = NewsletterRun.objects.create(newsletter=self.newsletter, dispatch_token='token')
+        NewsletterRunChunk.objects.create(run=run, status='F')
+
+        finish_newsletter_run.apply(args=[run.pk, 'token'])
+
+        apply_async.assert_not_called()
+
+
+class SupersededDispatchTest(DeliveryTestCase):
+
+    def test_chunks_and_callback_of_superseded_dispatch_do_nothing(self):
+        run = NewsletterRun.objects.create(newsletter=self.newsletter, dispatch_token='new')
+        chunk = NewsletterRunChunk.objects.create(run=run)
+
+        send_newsletter_chunk.apply(args=[chunk.pk, 'old'])
+        finish_newsletter_run.apply(args=[run.pk, 'old'])
+
+        chunk.refresh_from_db()
+        run.refresh_from_db()
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual((chunk.status, run.status), ('S', 'S'))
+
+
+class SendNewsletterCommandTest(TransactionTestCase):
+
+    def setUp(self):
+        user = CustomUser.objects.create(email='owner@test.ru')
+        clients = [Client.objects.create(email=f'client{index}@test.ru', first_name='Имя', last_name='Фамилия',
+                                         created_by=user)
+                   for index in range(3)]
+        message = Message.objects.create(subject='Тема', body='Текст', created_by=user)
+        self.newsletters = []
+        for _ in range(2):
+            newsletter = Newsletter.objects.create(time=time(9, 0), frequency='D', status='S',
+                                                   finish_date=date(2099, 1, 1), finish_time=time(0, 0),
+                                                   created_by=user)
+            newsletter.clients.set(clients)
+            newsletter.messages.set([message])
+            self.newsletters.append(newsletter)
+
+    def test_newsletters_are_sent_in_worker_processes(self):
+        out = StringIO()
+
+        call_command('sendnewsletter', *[newsletter.pk for newsletter in self.newsletters],
+                     '--workers', '2', '--dry-run', stdout=out)
+
+        for newsletter in self.newsletters:
+            self.assertIn(f'Newsletter {newsletter.pk} would send 3 emails', out.getvalue())
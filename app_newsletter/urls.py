@@ -8,7 +8,8 @@ from .views import (
     NewsletterUpdateView,
     NewsletterDeleteView,
     NewsletterLogListView,
-    NewsletterLogDetailView
+    NewsletterLogDetailView,
+    NewsletterLogExportView
 )
 
 app_name = AppNewsletterConfig.name
@@ -20,5 +21,6 @@ urlpatterns = [
     path('delete/<int:pk>/', NewsletterDeleteView.as_view(), name='newsletter_delete'),
     path('<int:pk>/', NewsletterDetailView.as_view(), name='newsletter_detail'),
     path('newsletterlogs/', NewsletterLogListView.as_view(), name='newsletter_log_list'),
+    path('newsletterlogs/export/', NewsletterLogExportView.as_view(), name='newsletter_log_export'),
     path('newsletterlogs/<int:pk>/', NewsletterLogDetailView.as_view(), name='newsletter_log_detail'),
 ]
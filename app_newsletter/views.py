@@ -2,16 +2,21 @@ from typing import Dict, Any
 
 from django.contrib import messages
 from django.db.models import QuerySet
-from django.http import HttpResponseRedirect
+from django.http import HttpRequest, HttpResponseBadRequest, HttpResponseRedirect, StreamingHttpResponse
 from django.shortcuts import redirect
 from django.urls import reverse, reverse_lazy
+from django.utils import timezone
+from django.views import View
 from django.views.generic import CreateView, ListView, DetailView, UpdateView, DeleteView
 
+from pagination.keyset import KeysetPaginationMixin
 from permissions.authenticate import AuthenticatedAccessMixin
 from permissions.user_permission import CreatorAccessMixin, CombinedAccessMixin, NewsletterLogAccessMixin
-from .forms import NewsletterCreateForm
+from .forms import NewsletterCreateForm, NewsletterLogExportForm
 from .models import Newsletter, NewsletterLog
-from .services import NewsletterDeliveryService, ActiveNewsletterMixin
+from .services import (
+    NewsletterDeliveryService, ActiveNewsletterMixin, DeliveryStatsService, NewsletterLogExportService
+)
 
 
 class NewsletterCreateView(AuthenticatedAccessMixin, CreateView):
@@ -51,10 +56,11 @@ class NewsletterCreateView(AuthenticatedAccessMixin, CreateView):
         return redirect(reverse('app_main:index'))
 
 
-class NewsletterListView(AuthenticatedAccessMixin, ListView):
+class NewsletterListView(AuthenticatedAccessMixin, KeysetPaginationMixin, ListView):
 
     model = Newsletter
     paginate_by = 5
+    keyset_ordering = '-created_at'
 
     def get_queryset(self) -> QuerySet[Newsletter]:
 
@@ -64,7 +70,6 @@ class NewsletterListView(AuthenticatedAccessMixin, ListView):
         else:
             queryset = Newsletter.objects.filter(created_by=user)
 
-        queryset = queryset.order_by('-created_at')
         return queryset
 
 
@@ -72,6 +77,11 @@ class NewsletterDetailView(CombinedAccessMixin, DetailView):
 
     model = Newsletter
 
+    def get_context_data(self, **kwargs) -> Dict[str, Any]:
+        context = super().get_context_data(**kwargs)
+        context['delivery_totals'] = DeliveryStatsService.get_newsletter_totals(newsletter=self.object)
+        return context
+
 
 class NewsletterUpdateView(CreatorAccessMixin, ActiveNewsletterMixin, UpdateView):
 
@@ -118,10 +128,11 @@ class NewsletterDeleteView(CombinedAccessMixin, ActiveNewsletterMixin, DeleteVie
         return HttpResponseRedirect(self.get_success_url())
 
 
-class NewsletterLogListView(AuthenticatedAccessMixin, ListView):
+class NewsletterLogListView(AuthenticatedAccessMixin, KeysetPaginationMixin, ListView):
 
     model = NewsletterLog
     paginate_by = 5
+    keyset_ordering = '-date_time'
 
     def get_queryset(self) -> QuerySet[NewsletterLog]:
 
@@ -129,12 +140,47 @@ class NewsletterLogListView(AuthenticatedAccessMixin, ListView):
         if user.is_superuser or user.is_staff:
             queryset = NewsletterLog.objects.all()
         else:
-            queryset = NewsletterLog.objects.filter(newsletter__created_by=user)
+            queryset = NewsletterLog.objects.filter(owner=user)
 
-        queryset = queryset.order_by('-date_time')
+        queryset = queryset.select_related('newsletter', 'owner', 'client', 'response')
         return queryset
 
 
+class NewsletterLogExportView(AuthenticatedAccessMixin, View):
+    """
+    Выгрузка журнала рассылок в CSV или JSONL.
+    Пользователь получает логи своих рассылок, сотрудники — все логи.
+    Фильтры передаются в строке запроса: format, newsletter, status, date_from и date_to.
+    """
+
+    CONTENT_TYPES = {
+        'csv': 'text/csv; charset=utf-8',
+        'jsonl': 'application/x-ndjson; charset=utf-8',
+    }
+
+    def get(self, request: HttpRequest, *args, **kwargs) -> StreamingHttpResponse:
+
+        form = NewsletterLogExportForm(request.GET)
+        if not form.is_valid():
+            return HttpResponseBadRequest(form.errors.as_text(), content_type='text/plain; charset=utf-8')
+
+        user = request.user
+        file_format = form.cleaned_data['format'] or 'csv'
+        export_service = NewsletterLogExportService(
+            owner_id=None if user.is_superuser or user.is_staff else user.pk,
+            newsletter_id=form.cleaned_data['newsletter'],
+            status=form.cleaned_data['status'],
+            date_from=form.cleaned_data['date_from'],
+            date_to=form.cleaned_data['date_to']
+        )
+
+        response = StreamingHttpResponse(export_service.iter_lines(file_format=file_format),
+                                         content_type=self.CONTENT_TYPES[file_format])
+        filename = f'newsletter_logs_{timezone.localtime():%Y%m%d_%H%M%S}.{file_format}'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
 class NewsletterLogDetailView(NewsletterLogAccessMixin, DetailView):
 
     model = NewsletterLog
@@ -0,0 +1,41 @@
+import os
+from typing import Dict, Optional
+
+import django
+from django.db import connections
+
+# Модуль загружается процессами пула команды sendnewsletter до настройки Django,
+# поэтому модели и сервисы импортируются только внутри функций
+
+
+def init_worker(settings_module: str, database_names: Dict[str, str]) -> None:
+    """
+    Настраивает Django в процессе пула команды sendnewsletter.
+    Процессы запускаются методом spawn и не наследуют настройки родительского процесса,
+    поэтому модуль настроек и имена баз данных (при запуске из тестов — тестовых) передаются явно.
+    """
+    os.environ['DJANGO_SETTINGS_MODULE'] = settings_module
+    django.setup()
+    for alias, name in database_names.items():
+        connections[alias].settings_dict['NAME'] = name
+
+
+def deliver_newsletter(newsletter_id: int, batch_size: Optional[int], dry_run: bool, progress_queue) -> Dict[str, int]:
+    """
+    Отправляет одну рассылку. Выполняется в отдельном процессе пула команды sendnewsletter
+    и передаёт прогресс в родительский процесс через progress_queue.
+    """
+    from app_newsletter.models import Newsletter
+    from app_newsletter.services import NewsletterDeliveryService
+
+    newsletter = Newsletter.objects.get(pk=newsletter_id)
+
+    def send_progress(chunk_id: Optional[int], totals: Dict[str, int]) -> None:
+        progress_queue.put(('progress', newsletter_id, chunk_id, dict(totals)))
+
+    delivery_service = NewsletterDeliveryService(newsletter=newsletter, batch_size=batch_size,
+                                                 progress_callback=send_progress)
+    progress_queue.put(('start', newsletter_id, delivery_service.count_deliveries()))
+    if dry_run:
+        return delivery_service.preview()
+    return delivery_service.send_mail_to_client()
@@ -17,6 +17,7 @@ from django.utils.http import urlsafe_base64_decode
 from django.views import View
 from django.views.generic import CreateView, UpdateView, ListView
 
+from pagination.keyset import KeysetPaginationMixin
 from permissions.user_permission import ManagerAccessMixin
 from .forms import UserRegistrationForm, UserLoginForm, UserUpdateForm, CustomPasswordResetForm, CustomSetPasswordForm
 from .models import CustomUser
@@ -168,7 +169,7 @@ class ProfileUpdateView(UpdateView):
         return context
 
 
-class UserListView(ManagerAccessMixin, ListView):
+class UserListView(ManagerAccessMixin, KeysetPaginationMixin, ListView):
 
     model = CustomUser
     paginate_by = 5
@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 import os
 from pathlib import Path
 
+from kombu import Queue
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -38,7 +40,7 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
 
-    #'django_celery_beat',
+    'django_celery_beat',
 
     # Local apps
     'app_user.apps.AppUserConfig',
@@ -144,6 +146,23 @@ EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
 EMAIL_USE_TLS = False
 EMAIL_USE_SSL = True
+EMAIL_TIMEOUT = 30
+
+# Сколько раз переподключаться к SMTP-серверу, если он разорвал сессию во время рассылки
+NEWSLETTER_SMTP_RECONNECT_ATTEMPTS = 2
+# После стольких ошибок соединения с почтовым сервером подряд запуск рассылки прерывается
+NEWSLETTER_CIRCUIT_BREAKER_THRESHOLD = 10
+# Логи отправки пишутся в базу пачками: по заполнении буфера или раз в указанное число секунд
+NEWSLETTER_LOG_BUFFER_SIZE = 500
+NEWSLETTER_LOG_FLUSH_INTERVAL = 5
+# Сколько id ответов почтового сервера хранить в памяти процесса при записи логов
+NEWSLETTER_SERVER_RESPONSE_CACHE_SIZE = 1024
+# Число потоков (и SMTP-соединений), одновременно отправляющих письма в одном процессе,
+# и размер пачки клиентов, которая отправляется параллельно
+NEWSLETTER_DELIVERY_CONCURRENCY = 10
+NEWSLETTER_DELIVERY_BATCH_SIZE = 100
+# Сколько скомпилированных шаблонов сообщений хранить в памяти процесса
+MESSAGE_TEMPLATE_CACHE_SIZE = 256
 
 CELERY_BROKER_URL = 'redis://localhost:6379/0'
 CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
@@ -153,6 +172,101 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'Europe/Moscow'
 
+# Redis, через который воркеры рассылок согласуют общие ограничения
+NEWSLETTER_REDIS_URL = CELERY_BROKER_URL
+
+# Общий для всех воркеров лимит отправки писем через один почтовый сервер и учётную запись (писем в секунду).
+# При ответах сервера о перегрузке лимит снижается в NEWSLETTER_SMTP_RATE_BACKOFF раз, но не ниже
+# NEWSLETTER_SMTP_RATE_LIMIT_MIN, и восстанавливается на NEWSLETTER_SMTP_RATE_RECOVERY писем/с за секунду.
+# None отключает ограничение
+NEWSLETTER_SMTP_RATE_LIMIT = 10
+NEWSLETTER_SMTP_RATE_LIMIT_MIN = 1
+NEWSLETTER_SMTP_RATE_BURST = 10
+NEWSLETTER_SMTP_RATE_BACKOFF = 0.5
+NEWSLETTER_SMTP_RATE_RECOVERY = 0.1
+
+# Рассылка делится на диапазоны id клиентов, которые отправляются параллельными подзадачами.
+# Диапазон содержит не меньше NEWSLETTER_CHUNK_SIZE клиентов, а подзадач у одной рассылки
+# не больше NEWSLETTER_MAX_PARALLEL_CHUNKS
+NEWSLETTER_CHUNK_SIZE = 1000
+NEWSLETTER_MAX_PARALLEL_CHUNKS = 16
+# Незавершённый запуск рассылки продолжается при следующем запуске, если начат не раньше, чем столько секунд назад
+NEWSLETTER_RUN_RESUME_WINDOW = 12 * 60 * 60
+# Прерванный запуск продолжается автоматически не раньше, чем через столько секунд.
+# Каждое следующее продолжение откладывается на время, прошедшее с начала запуска, в пределах окна выше
+NEWSLETTER_RUN_RESUME_DELAY = 5 * 60
+# Время жизни блокировки запуска рассылки в секундах. Пока идёт отправка, блокировка продлевается,
+# а если воркер упал — истекает сама. Должно быть больше времени ожидания подзадач в очереди
+NEWSLETTER_RUN_LOCK_TTL = 15 * 60
+
+# Части рассылок отправляются в NEWSLETTER_DELIVERY_QUEUE_COUNT очередей 'newsletters.N', пользователь
+# закрепляется за очередью по хешу id. Воркер читает все очереди по кругу, поэтому большая рассылка
+# одного пользователя не задерживает рассылки пользователей из других очередей.
+# Одновременно отправляется не больше NEWSLETTER_OWNER_CONCURRENCY частей рассылок одного пользователя
+# (None отключает ограничение), остальные откладываются на NEWSLETTER_OWNER_RETRY_DELAY секунд.
+# Слот пользователя освобождается сам через NEWSLETTER_OWNER_SLOT_TTL секунд, если воркер упал
+NEWSLETTER_DELIVERY_QUEUE_COUNT = 8
+NEWSLETTER_OWNER_CONCURRENCY = 4
+NEWSLETTER_OWNER_RETRY_DELAY = 5
+NEWSLETTER_OWNER_SLOT_TTL = 60
+
+# Воркер не берёт задачи впрок, чтобы следующую задачу выбирал по кругу среди всех очередей
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+CELERY_TASK_QUEUES = [
+    Queue('celery'),
+    *(Queue(f'newsletters.{index}') for index in range(NEWSLETTER_DELIVERY_QUEUE_COUNT)),
+]
+
+# Письма, не отправленные из-за временной ошибки сервера (4xx, обрыв соединения), попадают в очередь повторов.
+# Задержка перед повтором удваивается с каждой попыткой от NEWSLETTER_RETRY_BASE_DELAY до
+# NEWSLETTER_RETRY_MAX_DELAY секунд, всего делается не больше NEWSLETTER_RETRY_MAX_ATTEMPTS попыток
+NEWSLETTER_RETRY_BASE_DELAY = 60
+NEWSLETTER_RETRY_MAX_DELAY = 60 * 60
+NEWSLETTER_RETRY_MAX_ATTEMPTS = 5
+NEWSLETTER_RETRY_BATCH_SIZE = 500
+NEWSLETTER_RETRY_LEASE = 10 * 60
+
+# Способ запуска рассылок по расписанию:
+# 'dispatcher' — одна периодическая задача каждые NEWSLETTER_DISPATCH_INTERVAL секунд запускает рассылки,
+# у которых наступило время next_run_at, забирая их пачками по NEWSLETTER_DISPATCH_BATCH_SIZE;
+# 'beat' — для каждой рассылки создаётся своя периодическая задача django_celery_beat
+NEWSLETTER_SCHEDULER = 'dispatcher'
+NEWSLETTER_DISPATCH_INTERVAL = 15
+NEWSLETTER_DISPATCH_BATCH_SIZE = 500
+# Сглаживание расписания: запуск каждой рассылки сдвигается на постоянное для неё время
+# в пределах окна NEWSLETTER_SCHEDULE_SMOOTHING_WINDOW секунд после выбранного времени,
+# чтобы рассылки, назначенные на одну минуту, не запускались одновременно. None отключает сглаживание.
+# В режиме 'dispatcher' новое окно применяется со следующего запуска рассылки,
+# в режиме 'beat' расписания задач пересчитывает команда reconcilenewsletters
+NEWSLETTER_SCHEDULE_SMOOTHING_WINDOW = None
+# Как часто завершать рассылки, время завершения которых наступило (в секундах)
+NEWSLETTER_EXPIRY_SWEEP_INTERVAL = 60
+
+# Логи отправки старше NEWSLETTER_LOG_RETENTION_DAYS дней команда archivenewsletterlogs переносит
+# в сжатые файлы в каталоге NEWSLETTER_LOG_ARCHIVE_DIR и удаляет из базы пачками по NEWSLETTER_LOG_ARCHIVE_BATCH_SIZE
+NEWSLETTER_LOG_RETENTION_DAYS = 180
+NEWSLETTER_LOG_ARCHIVE_DIR = os.path.join(BASE_DIR, 'archive')
+NEWSLETTER_LOG_ARCHIVE_BATCH_SIZE = 5000
+
+# Выгрузка логов (NewsletterLogExportService) читает логи серверным курсором
+# и отдаёт строки порциями по NEWSLETTER_LOG_EXPORT_CHUNK_SIZE
+NEWSLETTER_LOG_EXPORT_CHUNK_SIZE = 2000
+
+CELERY_BEAT_SCHEDULE = {
+    'dispatch-due-newsletters': {
+        'task': 'app_newsletter.tasks.dispatch_due_newsletters',
+        'schedule': NEWSLETTER_DISPATCH_INTERVAL,
+    },
+    'finish-expired-newsletters': {
+        'task': 'app_newsletter.tasks.finish_expired_newsletters',
+        'schedule': NEWSLETTER_EXPIRY_SWEEP_INTERVAL,
+    },
+    'retry-failed-newsletter-deliveries': {
+        'task': 'app_newsletter.tasks.retry_failed_deliveries',
+        'schedule': 60,
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
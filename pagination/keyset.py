@@ -0,0 +1,171 @@
+import base64
+import binascii
+import json
+from collections.abc import Sequence
+from typing import Any, List, Optional, Tuple
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Model, Q, QuerySet
+from django.http import Http404
+
+
+class InvalidCursor(Exception):
+    """
+    Курсор страницы повреждён или не подходит к списку.
+    """
+
+
+class KeysetPage(Sequence):
+    """
+    Страница списка, полученная по курсору.
+    Повторяет интерфейс django.core.paginator.Page, которым пользуется шаблон includes/paginator.html:
+    вместо номеров соседних страниц previous_page_number и next_page_number возвращают их курсоры.
+    """
+
+    def __init__(self, object_list: List[Model], paginator: 'KeysetPaginator', cursor: str,
+                 previous_cursor: Optional[str], next_cursor: Optional[str]) -> None:
+        self.object_list = object_list
+        self.paginator = paginator
+        self.number = cursor
+        self.previous_cursor = previous_cursor
+        self.next_cursor = next_cursor
+
+    def __repr__(self) -> str:
+        return f'<Page {self.number or "first"}>'
+
+    def __len__(self) -> int:
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    def has_previous(self) -> bool:
+        return self.previous_cursor is not None
+
+    def has_other_pages(self) -> bool:
+        return self.has_previous() or self.has_next()
+
+    def next_page_number(self) -> Optional[str]:
+        return self.next_cursor
+
+    def previous_page_number(self) -> Optional[str]:
+        return self.previous_cursor
+
+
+class KeysetPaginator:
+    """
+    Пагинатор, который выбирает страницу условием по столбцу сортировки и pk вместо OFFSET
+    и не считает строки списка. Поэтому любая страница стоит столько же, сколько первая.
+
+    Курсор — закодированные в base64 направление перехода и значения (столбец, pk)
+    крайней строки соседней страницы. Столбец сортировки не должен содержать NULL.
+    """
+
+    # Номера страниц неизвестны без подсчёта строк, поэтому шаблон показывает только ссылки назад и вперёд
+    page_range = ()
+
+    def __init__(self, object_list: QuerySet, per_page: int, ordering: str) -> None:
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.descending = ordering.startswith('-')
+        self.field_name = ordering.lstrip('-')
+        opts = object_list.model._meta
+        self.field = opts.pk if self.field_name == 'pk' else opts.get_field(self.field_name)
+        self.pk_field = opts.pk
+
+    def page(self, cursor: Optional[str]) -> KeysetPage:
+        """
+        Возвращает страницу по курсору, пустой курсор означает первую страницу.
+        :param cursor: Курсор из ссылки на страницу.
+        """
+        if not cursor:
+            return self.get_page(cursor='', backwards=False, position=None)
+        backwards, value, pk = self.decode_cursor(cursor)
+        return self.get_page(cursor=cursor, backwards=backwards, position=(value, pk))
+
+    def get_page(self, cursor: str, backwards: bool, position: Optional[Tuple[Any, Any]]) -> KeysetPage:
+        """
+        Выбирает per_page + 1 строк после (или, при backwards, перед) position.
+        Лишняя строка показывает, есть ли ещё страницы в направлении перехода.
+        """
+        descending = self.descending != backwards
+        prefix = '-' if descending else ''
+        queryset = self.object_list.order_by(f'{prefix}{self.field_name}', f'{prefix}pk')
+        if position is not None:
+            queryset = queryset.filter(self.get_position_filter(descending=descending, position=position))
+
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+
+        has_previous = has_more if backwards else position is not None
+        has_next = position is not None if backwards else has_more
+        return KeysetPage(
+            object_list=rows,
+            paginator=self,
+            cursor=cursor,
+            previous_cursor=self.encode_cursor(backwards=True, obj=rows[0]) if rows and has_previous else None,
+            next_cursor=self.encode_cursor(backwards=False, obj=rows[-1]) if rows and has_next else None
+        )
+
+    def get_position_filter(self, descending: bool, position: Tuple[Any, Any]) -> Q:
+        """
+        Возвращает условие «строка идёт после position» в порядке сортировки.
+        Кроме (столбец < значение ИЛИ столбец = значение И pk < pk курсора) условие содержит
+        отдельную границу столбец <= значение: по ней PostgreSQL начинает чтение индекса (столбец, id)
+        сразу с позиции курсора, а не отбрасывает все строки предыдущих страниц.
+        """
+        value, pk = position
+        lookup = 'lt' if descending else 'gt'
+        if self.field_name == 'pk':
+            return Q(**{f'pk__{lookup}': pk})
+        return (
+            Q(**{f'{self.field_name}__{lookup}e': value})
+            & (Q(**{f'{self.field_name}__{lookup}': value}) | Q(**{f'pk__{lookup}': pk}))
+        )
+
+    def encode_cursor(self, backwards: bool, obj: Model) -> str:
+        value = getattr(obj, self.field.attname)
+        if hasattr(value, 'isoformat'):
+            # DjangoJSONEncoder округляет время до миллисекунд, а курсору нужно точное значение
+            value = value.isoformat()
+        data = json.dumps([int(backwards), value, obj.pk], cls=DjangoJSONEncoder, separators=(',', ':'))
+        return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor: str) -> Tuple[bool, Any, Any]:
+        try:
+            data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            backwards, value, pk = json.loads(data)
+            return bool(backwards), self.field.to_python(value), self.pk_field.to_python(pk)
+        except (binascii.Error, UnicodeDecodeError, ValueError, TypeError, ValidationError):
+            raise InvalidCursor(cursor)
+
+
+class KeysetPaginationMixin:
+    """
+    Миксин для ListView, который заменяет постраничный вывод с OFFSET на выборку по курсору.
+    Порядок списка задаёт keyset_ordering (столбец сортировки, к которому добавляется pk),
+    размер страницы — paginate_by. В контексте шаблона остаются page_obj, paginator и is_paginated,
+    поэтому шаблоны со списками и includes/paginator.html не меняются.
+    """
+
+    keyset_ordering = 'pk'
+
+    def paginate_queryset(self, queryset: QuerySet, page_size: int) -> Tuple[KeysetPaginator, KeysetPage, list, bool]:
+        """
+        Возвращает страницу по курсору из параметра page_kwarg запроса.
+        Если курсор повреждён, отвечает 404, как ListView на несуществующий номер страницы.
+        """
+        paginator = KeysetPaginator(object_list=queryset, per_page=page_size, ordering=self.keyset_ordering)
+        cursor = self.kwargs.get(self.page_kwarg) or self.request.GET.get(self.page_kwarg)
+        try:
+            page = paginator.page(cursor)
+        except InvalidCursor:
+            raise Http404('Неверная страница списка')
+        return paginator, page, page.object_list, page.has_other_pages()
@@ -109,7 +109,7 @@ class NewsletterLogAccessMixin:
     def dispatch(self, request, *args, **kwargs):
         log = self.get_object()
 
-        if log.newsletter.created_by != self.request.user and \
+        if log.owner_id != self.request.user.pk and \
                 not self.request.user.is_staff and \
                 not self.request.user.is_superuser:
             messages.info(request=request, message='У вас нет доступа к этому логу!')